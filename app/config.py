@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -7,6 +9,28 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    # Кэш сведений о пользователе для проверки токена (0 записей - каждый запрос читает БД)
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+
+    # Кэш уже проверенных JWT (по хешу токена до его exp), 0 - проверять подпись каждый раз
+    JWT_CACHE_MAX_ENTRIES: int = 10000
+
+    # Флаги и профиль пользователя в access-токене: чтение без запроса к users,
+    # эпоха безопасности сверяется не реже раза в SECURITY_EPOCH_TTL_SECONDS
+    ACCESS_TOKEN_CLAIMS: bool = False
+    SECURITY_EPOCH_TTL_SECONDS: int = 5
+
+    # Пул потоков для argon2: число потоков, длина очереди и сколько запрос готов ждать
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE: int = 32
+    PASSWORD_HASH_TIMEOUT_SECONDS: float = 5
+
+    # Параметры argon2 (None - значения passlib), подбираются командой python -m app.defs.auth.passwords
+    ARGON2_TIME_COST: Optional[int] = None
+    ARGON2_MEMORY_COST: Optional[int] = None
+    ARGON2_PARALLELISM: Optional[int] = None
+
     DATABASE_URL: str
     DATABASE_URL_SYNC: str
 
@@ -21,6 +45,33 @@ class Settings(BaseSettings):
     APP_URL: str = "http://localhost:8000"
     VERIFICATION_TOKEN_EXPIRE_HOURS: int = 24
 
+    # Движок сборки дерева: "python" (build_tree) или "postgres" (JSON из БД)
+    TREE_ENGINE: str = "python"
+
+    # Кэш сериализованного дерева в памяти процесса (0 записей - кэш выключен)
+    TREE_CACHE_MAX_ENTRIES: int = 1024
+    TREE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    TREE_CACHE_TTL_SECONDS: int = 300
+
+    # История заметок: полный снимок каждые N версий, хранится не больше M версий на заметку
+    NOTE_REVISION_SNAPSHOT_EVERY: int = 20
+    NOTE_REVISION_RETENTION: int = 200
+
+    # Тексты заметок больше порога (в байтах) хранятся сжатыми, 0 - не сжимать
+    NOTE_COMPRESS_THRESHOLD: int = 64 * 1024
+    NOTE_COMPRESS_LEVEL: int = 6
+    NOTE_COMPRESSED_PREVIEW_CHARS: int = 2000
+
+    # Сколько байт начала текста заметки попадает в поисковый индекс (tsvector ограничен 1 МБ)
+    NOTE_SEARCH_MAX_BYTES: int = 256 * 1024
+
+    # Импорт: заметок в одной транзакции и максимальный размер импортируемого файла
+    IMPORT_BATCH_SIZE: int = 1000
+    IMPORT_MAX_NOTE_BYTES: int = 10 * 1024 * 1024
+
+    # Отложенная запись автосохранений: правки заметки пишутся в БД не чаще раза в N секунд, 0 - сразу
+    NOTE_WRITE_BEHIND_SECONDS: float = 0
+
     class Config:
         env_file = ".env"
         case_sensitive = True
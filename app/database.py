@@ -1,3 +1,6 @@
+from typing import Any, Dict, List
+
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.config import settings
@@ -23,4 +26,18 @@ async def get_db() -> AsyncSession:
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+# asyncpg передаёт в одном запросе не больше 32767 параметров
+MAX_BIND_PARAMS = 32767
+
+
+async def insert_rows(db: AsyncSession, model, rows: List[Dict[str, Any]]) -> None:
+    """
+    Вставляет строки многострочными INSERT ... VALUES (...), (...), по одному запросу на пачку.
+    db.execute(insert(model), rows) с asyncpg выполняется как executemany - отдельный INSERT
+    на каждую строку. Все строки должны содержать одинаковые ключи.
+    """
+    size = max(1, MAX_BIND_PARAMS // len(model.__table__.columns))
+    for start in range(0, len(rows), size):
+        await db.execute(insert(model).values(rows[start:start + size]))
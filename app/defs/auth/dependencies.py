@@ -5,28 +5,30 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.defs.auth.jwt_handler import decode_jwt
+from app.defs.auth.principal_cache import Principal, principal_cache
+from app.defs.auth.token_claims import epoch_is_current, has_claims
 from app.models.database import User
 from app.database import get_db
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-async def get_current_user(
-        access_token: Optional[str] = Cookie(None),
-        db: AsyncSession = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"}
     )
+
+def get_token_payload(access_token: Optional[str]) -> dict:
+    """Проверенное содержимое access-токена"""
     payload = decode_jwt(access_token)
     if payload is None:
-        raise credentials_exception
-    
+        raise credentials_exception()
+
     user_id: str = payload.get("sub")
     if user_id is None:
-        raise credentials_exception
-    
+        raise credentials_exception()
+
     token_type = payload.get("type")
     if token_type != "access":
         raise HTTPException(
@@ -34,28 +36,78 @@ async def get_current_user(
             detail="Pleace provide an access token, not a refresh token"
         )
 
-    # return user_id
-    result = await db.execute(select(User).where(User.id == int(user_id)))
-    user = result.scalar_one_or_none()
-
-    if user is None:
-        raise credentials_exception
-    
-    return user
+    return payload
 
-async def get_current_active_user(
-        current_user: Annotated[User, Depends(get_current_user)]
-) -> User:
-    if not current_user.is_active:
+def check_active(user) -> None:
+    if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Inactive user"
         )
-    
-    if not current_user.is_verified:
+
+    if not user.is_verified:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Email not verified"
         )
-    
-    return current_user
\ No newline at end of file
+
+async def get_current_principal(
+        access_token: Optional[str] = Cookie(None),
+        db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """
+    Облегчённый текущий пользователь (id, is_active, is_verified, username).
+    В режиме ACCESS_TOKEN_CLAIMS берётся из самого токена после сверки эпохи,
+    иначе из principal_cache, а при промахе читаются только эти четыре колонки.
+    """
+    payload = get_token_payload(access_token)
+    user_id = int(payload["sub"])
+
+    if has_claims(payload):
+        if not await epoch_is_current(db, payload):
+            raise credentials_exception()
+
+        return Principal(user_id, payload.get("is_active"), payload.get("is_verified"), payload.get("username"))
+
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        row = (await db.execute(
+            select(User.id, User.is_active, User.is_verified, User.username).where(User.id == user_id)
+        )).one_or_none()
+
+        if row is None:
+            raise credentials_exception()
+
+        principal = Principal(row.id, row.is_active, row.is_verified, row.username)
+        principal_cache.set(principal)
+
+    return principal
+
+async def get_current_active_principal(
+        principal: Annotated[Principal, Depends(get_current_principal)]
+) -> Principal:
+    check_active(principal)
+
+    return principal
+
+async def get_current_user(
+        access_token: Optional[str] = Cookie(None),
+        db: AsyncSession = Depends(get_db)
+) -> User:
+    """Полный ORM-объект пользователя - для эндпоинтов, которые его меняют или читают пароль"""
+    payload = get_token_payload(access_token)
+
+    result = await db.execute(select(User).where(User.id == int(payload["sub"])))
+    user = result.scalar_one_or_none()
+
+    if user is None or (has_claims(payload) and payload["epoch"] != user.security_epoch):
+        raise credentials_exception()
+
+    return user
+
+async def get_current_active_user(
+        current_user: Annotated[User, Depends(get_current_user)]
+) -> User:
+    check_active(current_user)
+
+    return current_user
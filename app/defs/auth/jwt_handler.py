@@ -1,5 +1,8 @@
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import jwt
 from jwt.exceptions import InvalidTokenError
 from app.config import settings
@@ -46,14 +49,68 @@ def create_refresh_token(data: dict) -> str:
     )
     return encoded_jwt
 
+class VerifiedTokenCache:
+    """
+    Содержимое токенов с уже проверенной подписью, ключ - sha256 токена.
+    Запись живёт до exp токена; браузер присылает один и тот же access_token
+    на каждый запрос, поэтому подпись и claims разбираются один раз.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+
+    def get(self, key: bytes) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: bytes, payload: dict) -> None:
+        expires_at = payload.get("exp")
+        if self.max_entries <= 0 or not isinstance(expires_at, (int, float)):
+            return
+
+        self._entries[key] = (expires_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries)
+        }
+
+
+token_cache = VerifiedTokenCache(settings.JWT_CACHE_MAX_ENTRIES)
+
 def decode_jwt(token: str) -> Optional[dict]:
+    key = hashlib.sha256(token.encode()).digest() if isinstance(token, str) else None
+    if key is not None:
+        payload = token_cache.get(key)
+        if payload is not None:
+            return dict(payload)
+
     try:
         payload = jwt.decode(
             token,
             settings.SECRET_KEY,
             algorithms=[settings.ALGORITHM]
         )
-        return payload
+        if key is not None:
+            token_cache.set(key, payload)
+        return dict(payload)
     except InvalidTokenError:
         return None
     except Exception as e:
@@ -0,0 +1,91 @@
+"""
+Пул потоков для хеширования и проверки паролей (argon2).
+
+argon2 занимает процессор на десятки миллисекунд, а в обработчике напрямую блокировал бы
+весь event loop воркера. В пуле ограничено число потоков и длина очереди: при переполнении
+запрос сразу получает 503, а не ждёт, пока разгребётся всплеск логинов. argon2-cffi
+отпускает GIL на время вычисления, поэтому потоков достаточно и процессы не нужны.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+
+
+def _timed(fn: Callable, args: tuple, queued_at: float):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, started - queued_at, time.perf_counter() - started
+
+
+class PasswordHashPool:
+    def __init__(self, workers: int, max_queue: int, timeout_seconds: float) -> None:
+        self.workers = workers
+        self.max_in_flight = workers + max_queue
+        self.timeout_seconds = timeout_seconds
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.work_seconds = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    def _busy(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен, попробуйте ещё раз",
+            headers={"Retry-After": "1"}
+        )
+
+    def _done(self, future: asyncio.Future) -> None:
+        # Задача освобождает место, только когда поток действительно закончил работу,
+        # даже если ожидавший её запрос уже ушёл по таймауту
+        self.in_flight -= 1
+        if not future.cancelled() and future.exception() is None:
+            _, waited, worked = future.result()
+            self.completed += 1
+            self.wait_seconds += waited
+            self.work_seconds += worked
+
+    async def run(self, fn: Callable, *args) -> Any:
+        if self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            raise self._busy()
+
+        self.in_flight += 1
+        future = asyncio.get_running_loop().run_in_executor(self._executor, _timed, fn, args, time.perf_counter())
+        future.add_done_callback(self._done)
+
+        try:
+            result, _, _ = await asyncio.wait_for(asyncio.shield(future), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise self._busy()
+
+        return result
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "avg_wait_seconds": self.wait_seconds / self.completed if self.completed else 0.0,
+            "avg_work_seconds": self.work_seconds / self.completed if self.completed else 0.0
+        }
+
+
+password_pool = PasswordHashPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_QUEUE,
+    timeout_seconds=settings.PASSWORD_HASH_TIMEOUT_SECONDS
+)
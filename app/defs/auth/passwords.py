@@ -0,0 +1,130 @@
+"""
+Хеширование паролей (argon2) с параметрами из настроек ARGON2_*.
+
+Вычисления идут в пуле password_pool. Хеши со старыми параметрами после успешного
+входа пересчитываются в фоне (rehash_password), так что смена параметров доходит
+до всех активных пользователей без простоя.
+
+Подбор параметров под текущую машину:
+    python -m app.defs.auth.passwords --target-ms 250 [--memory-mib 64] [--write .env]
+"""
+import argparse
+import re
+import time
+from typing import Dict, Optional
+
+from passlib.context import CryptContext
+from passlib.hash import argon2
+from sqlalchemy import update
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.defs.auth.password_pool import password_pool
+from app.models.database import User
+
+
+def _argon2_options() -> Dict[str, int]:
+    options = {
+        "argon2__time_cost": settings.ARGON2_TIME_COST,
+        "argon2__memory_cost": settings.ARGON2_MEMORY_COST,
+        "argon2__parallelism": settings.ARGON2_PARALLELISM
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto", **_argon2_options())
+
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await password_pool.run(pwd_context.verify, password, hashed_password)
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Хеш посчитан с другими параметрами, чем заданы сейчас"""
+    return pwd_context.needs_update(hashed_password)
+
+
+async def rehash_password(user_id: int, password: str, old_hash: str) -> None:
+    """
+    Фоновая задача после входа: пересчитывает хеш с текущими параметрами.
+    Запись условная - если пароль за это время сменили, новый хеш не затирается.
+    """
+    try:
+        new_hash = await hash_password(password)
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(User)
+                .where(User.id == user_id, User.hashed_password == old_hash)
+                .values(hashed_password=new_hash)
+            )
+            await session.commit()
+    except Exception as e:
+        print(f"Password rehash failed for user {user_id}: {e}")
+
+
+def calibrate(target_ms: float, memory_mib: int, parallelism: int, samples: int = 3) -> Dict[str, int]:
+    """Наименьший time_cost, при котором хеш на этой машине занимает не меньше target_ms"""
+    memory_cost = memory_mib * 1024
+    time_cost = 1
+    while True:
+        handler = argon2.using(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+        started = time.perf_counter()
+        for _ in range(samples):
+            handler.hash("calibration password")
+        elapsed_ms = (time.perf_counter() - started) * 1000 / samples
+        print(f"time_cost={time_cost} memory={memory_mib} MiB parallelism={parallelism}: {elapsed_ms:.1f} ms")
+
+        if elapsed_ms >= target_ms or time_cost >= 100:
+            return {
+                "ARGON2_TIME_COST": time_cost,
+                "ARGON2_MEMORY_COST": memory_cost,
+                "ARGON2_PARALLELISM": parallelism
+            }
+        time_cost += 1
+
+
+def write_settings(path: str, values: Dict[str, int]) -> None:
+    """Обновляет (или добавляет) строки KEY=value в env-файле"""
+    try:
+        with open(path, encoding="utf-8") as env_file:
+            lines = env_file.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+
+    for key, value in values.items():
+        pattern = re.compile(rf"^\s*{key}\s*=")
+        line = f"{key}={value}"
+        for index, existing in enumerate(lines):
+            if pattern.match(existing):
+                lines[index] = line
+                break
+        else:
+            lines.append(line)
+
+    with open(path, "w", encoding="utf-8") as env_file:
+        env_file.write("\n".join(lines) + "\n")
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Подбор параметров argon2 под эту машину")
+    parser.add_argument("--target-ms", type=float, default=250, help="желаемое время одного хеша")
+    parser.add_argument("--memory-mib", type=int, default=64, help="память на один хеш")
+    parser.add_argument("--parallelism", type=int, default=1, help="потоков на один хеш")
+    parser.add_argument("--write", metavar="ENV_FILE", default=None, help="записать параметры в env-файл")
+    args = parser.parse_args(argv)
+
+    values = calibrate(args.target_ms, args.memory_mib, args.parallelism)
+    for key, value in values.items():
+        print(f"{key}={value}")
+
+    if args.write:
+        write_settings(args.write, values)
+        print(f"Written to {args.write}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Кэш сведений о пользователе, нужных для авторизации запроса.
+
+Запись сбрасывается в этом процессе при изменении пользователя (профиль, email,
+подтверждение, сброс пароля); другие воркеры увидят изменение не позже чем через
+PRINCIPAL_CACHE_TTL_SECONDS.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+
+
+class Principal:
+    """Облегчённый пользователь: всё, что нужно dashboard и проверкам доступа"""
+    __slots__ = ("id", "is_active", "is_verified", "username")
+
+    def __init__(self, id: int, is_active: bool, is_verified: bool, username: str) -> None:
+        self.id = id
+        self.is_active = is_active
+        self.is_verified = is_verified
+        self.username = username
+
+
+class PrincipalCache:
+    """LRU в памяти процесса с ограничением по числу записей и TTL"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Tuple[float, Principal]]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, principal: Principal) -> None:
+        if self.max_entries <= 0:
+            return
+
+        self._entries[principal.id] = (time.monotonic() + self.ttl_seconds, principal)
+        self._entries.move_to_end(principal.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries)
+        }
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,128 @@
+"""
+Режим ACCESS_TOKEN_CLAIMS: флаги и профиль пользователя передаются в access-токене.
+
+Эндпоинты, которым достаточно этих данных, не читают строку users. Токен действителен,
+только пока его "epoch" совпадает с users.security_epoch; эпоха берётся из кэша
+на SECURITY_EPOCH_TTL_SECONDS, поэтому отзыв доходит до всех воркеров за секунды.
+Всё, что должно отзывать выданные токены (смена и сброс пароля, деактивация),
+увеличивает security_epoch через revoke_tokens().
+"""
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.defs.auth.jwt_handler import create_access_token, create_refresh_token
+from app.models.database import User
+
+ACCESS_TOKEN_MINUTES = 30
+REFRESH_COOKIE_SECONDS = 2592000
+
+
+class SecurityEpochCache:
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[int, Tuple[float, int]] = {}
+
+    def get(self, user_id: int) -> Optional[int]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, user_id: int, epoch: int) -> None:
+        now = time.monotonic()
+        if len(self._entries) > settings.PRINCIPAL_CACHE_MAX_ENTRIES:
+            self._entries = {key: value for key, value in self._entries.items() if value[0] >= now}
+        self._entries[user_id] = (now + self.ttl_seconds, epoch)
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+
+security_epochs = SecurityEpochCache(settings.SECURITY_EPOCH_TTL_SECONDS)
+
+
+def has_claims(payload: Dict[str, Any]) -> bool:
+    return settings.ACCESS_TOKEN_CLAIMS and "epoch" in payload
+
+
+def user_claims(user: User) -> Dict[str, Any]:
+    """Дополнительные поля access-токена; пусто, если режим выключен"""
+    if not settings.ACCESS_TOKEN_CLAIMS:
+        return {}
+
+    return {
+        "username": user.username,
+        "email": user.email,
+        "full_name": user.full_name,
+        "is_active": user.is_active,
+        "is_verified": user.is_verified,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+        "epoch": user.security_epoch
+    }
+
+
+def epoch_claims(user: User) -> Dict[str, Any]:
+    """Поля refresh-токена: только эпоха"""
+    if not settings.ACCESS_TOKEN_CLAIMS:
+        return {}
+
+    return {"epoch": user.security_epoch}
+
+
+async def current_epoch(db: AsyncSession, user_id: int) -> Optional[int]:
+    epoch = security_epochs.get(user_id)
+    if epoch is None:
+        epoch = (await db.execute(
+            select(User.security_epoch).where(User.id == user_id)
+        )).scalar_one_or_none()
+
+        if epoch is not None:
+            security_epochs.set(user_id, epoch)
+
+    return epoch
+
+
+async def epoch_is_current(db: AsyncSession, payload: Dict[str, Any]) -> bool:
+    return await current_epoch(db, int(payload["sub"])) == payload.get("epoch")
+
+
+def revoke_tokens(user: User) -> None:
+    """Отзывает все выданные пользователю токены; кэш сбрасывается после commit через security_epochs.invalidate"""
+    user.security_epoch = (user.security_epoch or 0) + 1
+
+
+def set_access_cookie(response: Response, user: User) -> None:
+    access_token = create_access_token(
+        data={"sub": str(user.id), **user_claims(user)},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_MINUTES)
+    )
+
+    response.set_cookie(
+        key="access_token",
+        value=access_token,
+        httponly=True,
+        secure=False,
+        samesite="lax",
+        max_age=ACCESS_TOKEN_MINUTES * 60
+    )
+
+
+def set_refresh_cookie(response: Response, user: User) -> None:
+    refresh_token = create_refresh_token(
+        data={"sub": str(user.id), **epoch_claims(user)}
+    )
+
+    response.set_cookie(
+        key="refresh_token",
+        value=refresh_token,
+        httponly=True,
+        secure=False,
+        samesite="lax",
+        max_age=REFRESH_COOKIE_SECONDS
+    )
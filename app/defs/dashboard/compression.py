@@ -0,0 +1,99 @@
+"""
+Сжатие больших текстов заметок.
+
+Текст длиннее NOTE_COMPRESS_THRESHOLD байт хранится сжатым в notes.content_compressed
+с указанием кодека в notes.content_codec, а в notes.content остаётся начало текста
+(NOTE_COMPRESSED_PREVIEW_CHARS символов). Полный текст всегда читается через note_content().
+Поисковый индекс (notes.content_vector) строится из полного текста при каждой записи,
+поэтому сжатие на поиск не влияет.
+"""
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+CODEC_ZLIB = "zlib"
+
+
+class CompressionStats:
+    def __init__(self) -> None:
+        self.compressed_notes = 0
+        self.skipped_notes = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.compress_seconds = 0.0
+        self.decompressed_notes = 0
+        self.decompressed_bytes = 0
+        self.decompress_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        saved_kb = (self.raw_bytes - self.stored_bytes) / 1024
+        return {
+            "compressed_notes": self.compressed_notes,
+            "skipped_notes": self.skipped_notes,
+            "raw_bytes": self.raw_bytes,
+            "stored_bytes": self.stored_bytes,
+            "ratio": self.raw_bytes / self.stored_bytes if self.stored_bytes else 0.0,
+            "compress_seconds": self.compress_seconds,
+            "decompressed_notes": self.decompressed_notes,
+            "decompressed_bytes": self.decompressed_bytes,
+            "decompress_seconds": self.decompress_seconds,
+            # Сколько процессорного времени стоит каждый сэкономленный при записи килобайт
+            "compress_us_per_saved_kb": self.compress_seconds * 1e6 / saved_kb if saved_kb > 0 else 0.0
+        }
+
+
+compression_stats = CompressionStats()
+
+
+def encode_content(content: str) -> Dict[str, Any]:
+    """Значения колонок notes для текста: сжатого, если он большой и хорошо сжимается"""
+    plain = {"content": content, "content_codec": None, "content_compressed": None, "content_vector": content}
+
+    threshold = settings.NOTE_COMPRESS_THRESHOLD
+    if threshold <= 0 or len(content) * 4 < threshold:
+        return plain
+
+    raw = content.encode()
+    if len(raw) < threshold:
+        return plain
+
+    started = time.perf_counter()
+    packed = zlib.compress(raw, settings.NOTE_COMPRESS_LEVEL)
+    compression_stats.compress_seconds += time.perf_counter() - started
+
+    if len(packed) >= len(raw):
+        compression_stats.skipped_notes += 1
+        return plain
+
+    compression_stats.compressed_notes += 1
+    compression_stats.raw_bytes += len(raw)
+    compression_stats.stored_bytes += len(packed)
+
+    return {
+        "content": content[:settings.NOTE_COMPRESSED_PREVIEW_CHARS],
+        "content_codec": CODEC_ZLIB,
+        "content_compressed": packed,
+        "content_vector": content
+    }
+
+
+def decode_content(content: str, codec: Optional[str], compressed: Optional[bytes]) -> str:
+    if codec is None:
+        return content
+
+    if codec == CODEC_ZLIB:
+        started = time.perf_counter()
+        raw = zlib.decompress(compressed)
+        compression_stats.decompress_seconds += time.perf_counter() - started
+        compression_stats.decompressed_notes += 1
+        compression_stats.decompressed_bytes += len(raw)
+        return raw.decode()
+
+    raise ValueError(f"Unknown note content codec: {codec}")
+
+
+def note_content(note) -> str:
+    """Полный текст заметки (ORM-объекта или строки запроса с колонками content*)"""
+    return decode_content(note.content, note.content_codec, note.content_compressed)
@@ -1,16 +1,63 @@
-from typing import Any, Dict, List
-from uuid import UUID
+import json
+import uuid
+import zipfile
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Tuple
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncConnection
-from sqlalchemy import delete, select, update
-from sqlalchemy.orm import selectinload
+from sqlalchemy import ARRAY, any_, delete, func, literal, null, or_, select, tuple_, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
+
+from app.config import settings
+from app.database import AsyncSessionLocal, insert_rows
+from app.defs.dashboard.pagination import decode_cursor, encode_cursor
+from app.defs.dashboard.revisions import SNAPSHOT, reconstruct, revision_data, revision_kind
+from app.defs.dashboard.search import AUTOCOMPLETE_QUERY, HEADLINE_QUERY, SEARCH_NOTES_QUERY, escape_like
+from app.defs.dashboard.streaming import STREAM_BATCH_SIZE
+from app.defs.dashboard.text_patch import apply_patch
+from app.defs.dashboard.compression import decode_content, encode_content, note_content
+from app.defs.dashboard.etag import version_conflict
+from app.defs.dashboard.export import iter_vault_zip
+from app.defs.dashboard.importer import ImportEntry, decode_note, iter_zip_entries, note_title
+from app.defs.dashboard.links import parse_links
+from app.defs.dashboard.folder_paths import RESOLVE_PATH_QUERY, folder_path, path_ids, subtree_pattern
+from app.defs.dashboard.tree_cache import tree_cache
+from app.defs.dashboard.write_behind import PendingNoteWrite, write_behind
+from app.defs.dashboard.tree import build_folder_item, build_note_item, build_tree, stream_tree_json
+from app.models.database import Folder, NoteLink, NoteRevision, TreeTombstone, User, Note, note_sort_key, search_text
+
+
+def id_in(column, ids):
+    """column = ANY(:ids) - один параметр-массив вместо IN с отдельным параметром на каждый id"""
+    return column == any_(literal([uuid.UUID(str(i)) for i in ids], ARRAY(column.type)))
 
-from app.models.database import Folder, User, Note
 
 class Dashboard:
     def __init__(self, db_conn: AsyncConnection) -> None:
         self.db: AsyncConnection = db_conn
 
+    async def _bump_revision(self, user_id: int) -> int:
+        """
+        Увеличивает ревизию дерева пользователя и возвращает новое значение.
+        UPDATE держит блокировку строки пользователя до commit, поэтому ревизии
+        выдаются строго в порядке фиксации транзакций.
+        """
+        return (await self.db.execute(
+            update(User)
+            .where(User.id == int(user_id))
+            .values(tree_revision=User.tree_revision + 1)
+            .returning(User.tree_revision)
+        )).scalar_one()
+
+    async def _add_tombstone(self, user_id: int, item_id, item_type: str) -> None:
+        self.db.add(TreeTombstone(
+            user_id=user_id,
+            item_id=item_id,
+            item_type=item_type,
+            revision=await self._bump_revision(user_id)
+        ))
+
     async def new_note(self, user_id: int, title: str, content: str, folder_id = None):
         """Create a new note"""
         user = (await self.db.execute(select(User).where(User.id == int(user_id)))).scalar_one_or_none()
@@ -21,75 +68,360 @@ class Dashboard:
             title = content[:50]
 
         new_note = Note(
+            **encode_content(content),
             title=title,
-            content=content,
             user_id=user.id,
-            folder_id=folder_id
+            folder_id=folder_id,
+            revision=await self._bump_revision(user.id)
         )
 
         self.db.add(new_note)
+        await self.db.flush()
+        await self._sync_note_links(user.id, {new_note.id: content}, replace=False)
         await self.db.commit()
+        tree_cache.invalidate(user.id)
         await self.db.refresh(new_note)
 
-        return new_note
+        return {
+            **build_note_item(new_note),
+            "user_id": new_note.user_id,
+            "folder_id": str(new_note.folder_id) if new_note.folder_id else None,
+            "revision": new_note.revision,
+            "version": new_note.version
+        }
     
-    async def update_note(self, user: User, source_id, **kwargs):
+    async def update_note(self, user: User, source_id, expected_version: int = None, **kwargs):
+        """
+        Update a note. The body is either a full `content` (`body` is accepted as well)
+        or a compact `patch` against `base_revision`, see text_patch.py.
+        With `expected_version` the update is a compare-and-swap on Note.version
+        """
         title = kwargs.get('title')
-        body = kwargs.get('body')
+        body = kwargs.get('content', kwargs.get('body'))
+        patch = kwargs.get('patch')
+        base_revision = kwargs.get('base_revision')
         folder_id = kwargs.get('folder_id')
 
+        if write_behind.enabled and (title or body is not None or patch is not None):
+            return await self._buffer_note_update(user, source_id, expected_version, title, body, patch, base_revision)
+        await write_behind.flush_note(source_id)
+
         values = {}
         try:
-            if title or body:
+            revision = await self._bump_revision(user.id)
+
+            if patch is not None or body is not None:
+                current = await self._lock_note(user, source_id)
+                current_content = note_content(current)
+
+                if expected_version is not None and current.version != expected_version:
+                    raise version_conflict(current.version)
+
+                if patch is not None:
+                    body = self._apply_note_patch(current, current_content, patch, base_revision)
+
+                if body != current_content:
+                    await self._save_note_revision(user, source_id, current, current_content, body)
+                    await self._sync_note_links(user.id, {source_id: body})
+
+            if title or body is not None:
                 if title:
                     values['title'] = title
-                if body:
-                    values['content'] = body
+                if body is not None:
+                    values.update(encode_content(body))
+            else:
+                values['folder_id'] = folder_id
 
-                res = (await self.db.execute(
-                    update(Note)
-                    .where(Note.id == str(source_id), Note.user_id == int(user.id))
-                    .values(**values)
-                    .returning(Note.id)
-                )).scalar_one_or_none()
+            query = update(Note).where(Note.id == str(source_id), Note.user_id == int(user.id))
+            if expected_version is not None:
+                query = query.where(Note.version == expected_version)
 
-                if not res:
-                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
-                
-                await self.db.commit()
+            version = (await self.db.execute(
+                query
+                .values(**values, revision=revision, version=Note.version + 1)
+                .returning(Note.version)
+            )).scalar_one_or_none()
 
-                return {"status": "ok", "message": "Note successfully updated"}
-            
-            res = (await self.db.execute(
-                update(Note)
-                .where(Note.id == str(source_id), Note.user_id == int(user.id))
-                .values(folder_id = folder_id)
-                .returning(Note.id)
-            ))
+            if version is None:
+                await self._raise_update_failed(
+                    Note, user, source_id,
+                    HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+                )
 
-            if not res:
-                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
-                
             await self.db.commit()
+            tree_cache.invalidate(user.id)
 
-            return {"status": "ok", "message": "Note successfully updated"}
+            return {"status": "ok", "message": "Note successfully updated", "revision": revision, "version": version}
 
+        except HTTPException:
+            raise
         except Exception as e:
             print(str(e))
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")    
-    
+
+    async def _buffer_note_update(self, user: User, source_id, expected_version, title, body, patch, base_revision) -> Dict[str, Any]:
+        """
+        Отложенное изменение заметки (см. write_behind.py). Первая правка читает заметку
+        и резервирует ревизию дерева, следующие до записи в БД меняют только буфер.
+        """
+        note_id = uuid.UUID(str(source_id))
+
+        async with write_behind.lock(user.id):
+            pending = write_behind.get(note_id)
+            if pending is None:
+                current = (await self.db.execute(
+                    select(Note.content, Note.content_codec, Note.content_compressed, Note.title, Note.revision, Note.version)
+                    .where(Note.id == note_id, Note.user_id == int(user.id))
+                )).one_or_none()
+
+                if not current:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+
+                state, content, version = current, note_content(current), current.version
+            else:
+                state, content, version = pending, pending.content, pending.version
+
+            if expected_version is not None and version != expected_version:
+                raise version_conflict(version)
+
+            if patch is not None:
+                body = self._apply_note_patch(state, content, patch, base_revision)
+
+            if pending is None:
+                revision = await self._bump_revision(user.id)
+                await self.db.commit()
+                pending = PendingNoteWrite(user, note_id, current.title, content, current.version, revision)
+                write_behind.put(pending)
+            else:
+                write_behind.coalesced += 1
+
+            if title:
+                pending.title = title
+                pending.title_changed = True
+            if body is not None:
+                pending.content = body
+                pending.content_changed = True
+            pending.version += 1
+
+            return {"status": "ok", "message": "Note successfully updated", "revision": pending.revision, "version": pending.version}
+
+    async def write_pending_note(self, pending: PendingNoteWrite) -> None:
+        """
+        Записывает накопленные в буфере правки одной заметки.
+
+        Если строку успели изменить в обход буфера (например, перенесли заметку до того,
+        как первая правка попала в буфер), правки не отбрасываются: изменённые ими поля
+        пишутся поверх текущей строки с новой ревизией, а версия растёт на число правок.
+        Заменённый текст, как обычно, остаётся в истории заметки.
+        """
+        user = pending.user
+        try:
+            current = await self._lock_note(user, pending.note_id)
+        except HTTPException:
+            # Заметку удалили (например, вместе с папкой) - записывать нечего
+            return
+
+        values = {"revision": pending.revision, "version": pending.version}
+        if current.version != pending.base_version:
+            values["revision"] = await self._bump_revision(user.id)
+            values["version"] = current.version + pending.version - pending.base_version
+
+        if pending.title_changed:
+            values["title"] = pending.title
+
+        current_content = note_content(current)
+        if pending.content_changed and pending.content != current_content:
+            await self._save_note_revision(user, pending.note_id, current, current_content, pending.content)
+            await self._sync_note_links(user.id, {pending.note_id: pending.content})
+            values.update(encode_content(pending.content))
+
+        await self.db.execute(
+            update(Note)
+            .where(Note.id == pending.note_id, Note.user_id == user.id)
+            .values(**values)
+        )
+        await self.db.commit()
+        tree_cache.invalidate(user.id)
+
+    async def _raise_update_failed(self, model, user: User, source_id, not_found: HTTPException) -> None:
+        """Условный UPDATE не затронул строку: либо её нет, либо версия уже другая"""
+        current_version = (await self.db.execute(
+            select(model.version).where(model.id == str(source_id), model.user_id == int(user.id))
+        )).scalar_one_or_none()
+
+        if current_version is None:
+            raise not_found
+
+        raise version_conflict(current_version)
+
+    async def _lock_note(self, user: User, source_id):
+        """Текущие текст и версия заметки; строка блокируется до commit, чтобы её не изменили параллельно"""
+        note = (await self.db.execute(
+            select(Note.content, Note.content_codec, Note.content_compressed, Note.title, Note.revision, Note.version)
+            .where(Note.id == str(source_id), Note.user_id == int(user.id))
+            .with_for_update()
+        )).one_or_none()
+
+        if not note:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+
+        return note
+
+    def _apply_note_patch(self, current, content: str, patch, base_revision) -> str:
+        """Применяет патч к текущему тексту заметки, если она не менялась после base_revision"""
+        if base_revision is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ParameterError ['base_revision']")
+
+        if current.revision != base_revision:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Note revision is {current.revision}, patch is based on {base_revision}. Send the full content"
+            )
+
+        try:
+            return apply_patch(content, patch)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    async def _save_note_revision(self, user: User, source_id, current, old_content: str, new_content: str) -> None:
+        """Сохраняет заменяемую версию заметки в истории и отбрасывает версии сверх лимита"""
+        note_id = uuid.UUID(str(source_id))
+
+        last_snapshot = (
+            select(func.max(NoteRevision.version))
+            .where(NoteRevision.note_id == note_id, NoteRevision.kind == SNAPSHOT)
+            .scalar_subquery()
+        )
+        diffs_since_snapshot = (await self.db.execute(
+            select(func.count())
+            .select_from(NoteRevision)
+            .where(NoteRevision.note_id == note_id, NoteRevision.version > func.coalesce(last_snapshot, 0))
+        )).scalar_one()
+        kind = revision_kind(diffs_since_snapshot)
+
+        self.db.add(NoteRevision(
+            note_id=note_id,
+            user_id=user.id,
+            version=current.version,
+            kind=kind,
+            title=current.title,
+            data=revision_data(kind, old_content, new_content)
+        ))
+
+        # Восстановление идёт от новых версий к старым, поэтому удаление самых старых цепочку не рвёт
+        cutoff = (
+            select(NoteRevision.version)
+            .where(NoteRevision.note_id == note_id)
+            .order_by(NoteRevision.version.desc())
+            .offset(settings.NOTE_REVISION_RETENTION - 1)
+            .limit(1)
+            .scalar_subquery()
+        )
+        await self.db.execute(
+            delete(NoteRevision).where(NoteRevision.note_id == note_id, NoteRevision.version < cutoff)
+        )
+
+    async def _sync_note_links(self, user_id: int, contents: Dict[Any, str], replace: bool = True) -> None:
+        """
+        Пересчитывает ссылки только переданных заметок (id -> полный текст).
+        replace=False - для только что созданных заметок, у которых ссылок ещё нет.
+        """
+        if not contents:
+            return
+
+        if replace:
+            await self.db.execute(delete(NoteLink).where(id_in(NoteLink.source_id, contents.keys())))
+
+        rows = [
+            {"source_id": uuid.UUID(str(note_id)), "user_id": user_id, "target_type": target_type, "target_id": target_id}
+            for note_id, content in contents.items()
+            for target_type, target_id in parse_links(content, note_id)
+        ]
+        await insert_rows(self.db, NoteLink, rows)
+
+    async def list_note_revisions(self, user: User, source_id) -> List[Dict[str, Any]]:
+        await write_behind.flush_note(source_id)
+
+        rows = (await self.db.execute(
+            select(NoteRevision.version, NoteRevision.title, NoteRevision.created_at)
+            .where(NoteRevision.note_id == source_id, NoteRevision.user_id == user.id)
+            .order_by(NoteRevision.version.desc())
+        )).all()
+
+        return [
+            {
+                "version": row.version,
+                "title": row.title,
+                "created_at": row.created_at.isoformat() if row.created_at else None
+            }
+            for row in rows
+        ]
+
+    async def get_note_revision(self, user: User, source_id, version: int) -> Dict[str, Any]:
+        """
+        Текст заметки в версии version. Читается только отрезок истории от этой версии
+        до ближайшего более нового снимка (или до текущего текста), не больше
+        NOTE_REVISION_SNAPSHOT_EVERY строк.
+        """
+        await write_behind.flush_note(source_id)
+
+        head = (await self.db.execute(
+            select(Note.content, Note.content_codec, Note.content_compressed)
+            .where(Note.id == source_id, Note.user_id == user.id)
+        )).one_or_none()
+
+        if head is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+
+        snapshot_version = (
+            select(func.min(NoteRevision.version))
+            .where(
+                NoteRevision.note_id == source_id,
+                NoteRevision.version >= version,
+                NoteRevision.kind == SNAPSHOT
+            )
+            .scalar_subquery()
+        )
+        revisions = (await self.db.execute(
+            select(NoteRevision)
+            .where(
+                NoteRevision.note_id == source_id,
+                NoteRevision.user_id == user.id,
+                NoteRevision.version >= version,
+                or_(snapshot_version.is_(None), NoteRevision.version <= snapshot_version)
+            )
+            .order_by(NoteRevision.version.desc())
+        )).scalars().all()
+
+        if not revisions or revisions[-1].version != version:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Revision not found")
+
+        target = revisions[-1]
+        return {
+            "version": target.version,
+            "title": target.title,
+            "content": reconstruct(note_content(head), revisions),
+            "created_at": target.created_at.isoformat() if target.created_at else None
+        }
+
     async def delete_note(self, user: Note, source_id):
+        await write_behind.discard(user.id, source_id)
+
         try:
             res = (await self.db.execute(
                 delete(Note)
                 .where(Note.id == str(source_id), Note.user_id == int(user.id))
                 .returning(Note.id)
             )).scalar_one_or_none()
+
+            if res:
+                await self._add_tombstone(user.id, res, "note")
         except Exception as e:
             print(str(e))
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
         
         await self.db.commit()
+        tree_cache.invalidate(user.id)
 
         if not res:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Note does not exists")
@@ -100,42 +432,77 @@ class Dashboard:
         title = kwargs.get('title')
         parent_id = kwargs.get('folder_id')
 
+        parent_path = None
+        if parent_id:
+            parent_path = await self._folder_path(await self._get_folder(user, parent_id))
+
+        folder_id = uuid.uuid4()
         new_folder = Folder(
+            id=folder_id,
             title=title,
             user_id=user.id,
-            parent_id=parent_id
+            parent_id=parent_id,
+            path=folder_path(parent_path, folder_id),
+            revision=await self._bump_revision(user.id)
         )
 
         self.db.add(new_folder)
         await self.db.commit()
+        tree_cache.invalidate(user.id)
         await self.db.refresh(new_folder)
 
         return new_folder
     
-    async def update_folder(self, source_id, user: User, **kwargs):
+    async def update_folder(self, source_id, user: User, expected_version: int = None, **kwargs):
         title = kwargs.get('title')
         parent_id = kwargs.get('folder_id')
 
-        folder = (await self.db.execute(select(Folder).where(Folder.id == source_id, Folder.user_id == user.id))).scalar_one_or_none()
+        folder_not_found = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Folder not found")
+        revision = await self._bump_revision(user.id)
 
-        if folder:
-            if title:
-                folder.title = title
+        if title:
+            # Переименование - один условный UPDATE без предварительного SELECT
+            query = update(Folder).where(Folder.id == str(source_id), Folder.user_id == user.id)
+            if expected_version is not None:
+                query = query.where(Folder.version == expected_version)
 
-                await self.db.commit()
-                return {
-                    "message": "Folder successfully updated"
-                }
-                
-            folder.parent_id = parent_id
-            await self.db.commit()
+            version = (await self.db.execute(
+                query
+                .values(title=title, revision=revision, version=Folder.version + 1)
+                .returning(Folder.version)
+            )).scalar_one_or_none()
+
+            if version is None:
+                await self._raise_update_failed(Folder, user, source_id, folder_not_found)
 
+            await self.db.commit()
+            tree_cache.invalidate(user.id)
             return {
-                    "message": "Folder successfully updated"
+                "message": "Folder successfully updated",
+                "version": version
             }
-            
-        else:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Folder not found")
+
+        # Перемещение переписывает пути всего поддерева, поэтому строку папки блокируем
+        folder = (await self.db.execute(
+            select(Folder).where(Folder.id == source_id, Folder.user_id == user.id).with_for_update()
+        )).scalar_one_or_none()
+
+        if not folder:
+            raise folder_not_found
+
+        if expected_version is not None and folder.version != expected_version:
+            raise version_conflict(folder.version)
+
+        await self._move_folder(user, folder, parent_id)
+        folder.revision = revision
+        folder.version = folder.version + 1
+        await self.db.commit()
+        tree_cache.invalidate(user.id)
+
+        return {
+            "message": "Folder successfully updated",
+            "version": folder.version
+        }
     
     async def delete_folder(self, folder_id, user: User):
         res = (await self.db.execute(
@@ -146,81 +513,794 @@ class Dashboard:
 
         if not res:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Folder not found")
-        
+
+        # Вложенные папки и заметки удаляются каскадно, клиенту достаточно надгробия самой папки
+        await self._add_tombstone(user.id, res, "folder")
         await self.db.commit()
+        tree_cache.invalidate(user.id)
         
         return {
             "message": "Folder successfully deleted"
         }
     
-    async def get_tree(self, user: User) -> List[Dict[str, Any]]:
-        """Получить древовидную структуру папок и заметок"""
-        
-        # 1. Получаем ВСЕ папки пользователя (без joinedload, просто как есть)
-        all_folders_query = select(Folder).where(
-            Folder.user_id == user.id
-        ).options(
-            selectinload(Folder.notes)  # Загружаем заметки для каждой папки
+    async def batch(self, user: User, operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Применяет набор операций create/update/move/delete в одной транзакции.
+
+        Принадлежность всех упомянутых заметок и папок проверяется одним запросом,
+        все изменения получают одну ревизию дерева. Операции выполняются по фазам:
+        создание (в порядке запроса, поэтому родительская папка должна идти раньше
+        вложенных), изменение, перемещение, удаление. Перемещения заметок и удаления
+        выполняются общими UPDATE/DELETE ... WHERE id = ANY(...).
+        """
+        # Пакет меняет версии заметок, отложенные правки должны лечь раньше
+        await write_behind.flush_user(user.id)
+
+        phases = {"create": [], "update": [], "move": [], "delete": []}
+        for operation in operations:
+            operation = dict(operation)
+            for key in ("id", "folder_id"):
+                if operation.get(key):
+                    operation[key] = uuid.UUID(str(operation[key]))
+            phases[operation["op"]].append(operation)
+
+        for operation in phases["update"] + phases["move"] + phases["delete"]:
+            if not operation.get("id"):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ParameterError ['id']")
+        for operation in phases["update"]:
+            if operation["type"] == "folder" and not operation.get("title"):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ParameterError ['title']")
+        for operation in phases["create"]:
+            if operation["type"] == "note" and operation.get("content") is None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ParameterError ['content']")
+            if operation["type"] == "folder" and not operation.get("title"):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ParameterError ['title']")
+            operation["id"] = operation.get("id") or uuid.uuid4()
+
+        created = {(operation["type"], operation["id"]) for operation in phases["create"]}
+        referenced = {
+            (operation["type"], operation["id"])
+            for operation in phases["update"] + phases["move"] + phases["delete"]
+        }
+        referenced |= {
+            ("folder", operation["folder_id"])
+            for operation in phases["create"] + phases["move"]
+            if operation.get("folder_id")
+        }
+        referenced -= created
+
+        note_ids = [item_id for item_type, item_id in referenced if item_type == "note"]
+        folder_ids = [item_id for item_type, item_id in referenced if item_type == "folder"]
+        rows = (await self.db.execute(union_all(
+            select(literal("note").label("type"), Note.id, null().label("path"))
+            .where(Note.user_id == user.id, id_in(Note.id, note_ids)),
+            select(literal("folder"), Folder.id, Folder.path)
+            .where(Folder.user_id == user.id, id_in(Folder.id, folder_ids))
+        ))).all()
+
+        paths = {row.id: row.path for row in rows if row.type == "folder"}
+        missing = referenced - {(row.type, row.id) for row in rows}
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Items not found: {sorted(str(item_id) for _, item_id in missing)}"
+            )
+
+        revision = await self._bump_revision(user.id)
+
+        try:
+            for operation in phases["create"]:
+                parent_id = operation.get("folder_id")
+                if parent_id and parent_id not in paths:
+                    # Ссылка на папку, создаваемую позже в этом же запросе
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Folder not found")
+
+                if operation["type"] == "folder":
+                    if parent_id and paths[parent_id] is None:
+                        paths[parent_id] = await self._folder_path(await self._get_folder(user, parent_id))
+                    paths[operation["id"]] = folder_path(paths[parent_id] if parent_id else None, operation["id"])
+                    self.db.add(Folder(
+                        id=operation["id"],
+                        title=operation.get("title"),
+                        user_id=user.id,
+                        parent_id=parent_id,
+                        path=paths[operation["id"]],
+                        revision=revision
+                    ))
+                else:
+                    content = operation["content"]
+                    self.db.add(Note(
+                        **encode_content(content),
+                        id=operation["id"],
+                        title=operation.get("title") or content[:50],
+                        user_id=user.id,
+                        folder_id=parent_id,
+                        revision=revision
+                    ))
+            await self.db.flush()
+            await self._sync_note_links(user.id, {
+                operation["id"]: operation["content"] for operation in phases["create"] if operation["type"] == "note"
+            }, replace=False)
+
+            for operation in phases["update"]:
+                values = {}
+                if operation.get("title"):
+                    values["title"] = operation["title"]
+
+                if operation["type"] == "folder":
+                    model = Folder
+                else:
+                    model = Note
+                    content = operation.get("content")
+                    if content is not None:
+                        current = await self._lock_note(user, operation["id"])
+                        current_content = note_content(current)
+                        if content != current_content:
+                            await self._save_note_revision(user, operation["id"], current, current_content, content)
+                            await self._sync_note_links(user.id, {operation["id"]: content})
+                        values.update(encode_content(content))
+
+                if values:
+                    await self.db.execute(
+                        update(model)
+                        .where(model.id == operation["id"], model.user_id == user.id)
+                        .values(**values, revision=revision, version=model.version + 1)
+                    )
+
+            # Заметки, переносимые в одну папку, - одним UPDATE
+            note_moves = {}
+            for operation in phases["move"]:
+                if operation["type"] == "note":
+                    note_moves.setdefault(operation.get("folder_id"), []).append(operation["id"])
+            for target_id, ids in note_moves.items():
+                await self.db.execute(
+                    update(Note)
+                    .where(Note.user_id == user.id, id_in(Note.id, ids))
+                    .values(folder_id=target_id, revision=revision, version=Note.version + 1)
+                )
+
+            # Папки переносятся по одной: каждое перемещение переписывает пути поддерева,
+            # а следующее должно видеть уже обновлённые пути
+            for operation in phases["move"]:
+                if operation["type"] == "folder":
+                    folder = (await self.db.execute(
+                        select(Folder).where(Folder.id == operation["id"], Folder.user_id == user.id).with_for_update()
+                    )).scalar_one()
+                    await self._move_folder(user, folder, operation.get("folder_id"))
+                    folder.revision = revision
+                    folder.version = folder.version + 1
+            await self.db.flush()
+
+            deleted = 0
+            for item_type, model in (("note", Note), ("folder", Folder)):
+                ids = [operation["id"] for operation in phases["delete"] if operation["type"] == item_type]
+                if not ids:
+                    continue
+                removed = (await self.db.execute(
+                    delete(model)
+                    .where(model.user_id == user.id, id_in(model.id, ids))
+                    .returning(model.id)
+                )).scalars().all()
+                deleted += len(removed)
+                self.db.add_all([
+                    TreeTombstone(user_id=user.id, item_id=item_id, item_type=item_type, revision=revision)
+                    for item_id in removed
+                ])
+
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Item with this id already exists")
+
+        tree_cache.invalidate(user.id)
+
+        return {
+            "status": "ok",
+            "revision": revision,
+            "created": [{"id": str(operation["id"]), "type": operation["type"]} for operation in phases["create"]],
+            "updated": len(phases["update"]),
+            "moved": len(phases["move"]),
+            "deleted": deleted
+        }
+
+    async def _move_folder(self, user: User, folder: Folder, parent_id) -> None:
+        """Переносит заблокированную папку в parent_id и переписывает пути её поддерева"""
+        old_path = await self._folder_path(folder)
+        parent_path = None
+        if parent_id:
+            parent_path = await self._folder_path(await self._get_folder(user, parent_id))
+
+            # Папка-приёмник внутри перемещаемого поддерева - получился бы цикл
+            if parent_path.startswith(old_path):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Folder cannot be moved into itself")
+
+        # Переписываем префикс пути у всего поддерева одним UPDATE по индексу
+        new_path = folder_path(parent_path, folder.id)
+        await self.db.execute(
+            update(Folder)
+            .where(Folder.user_id == user.id, Folder.path.like(subtree_pattern(old_path)))
+            .values(path=func.concat(new_path, func.substr(Folder.path, len(old_path) + 1)))
+            .execution_options(synchronize_session=False)
         )
-        
-        result = await self.db.execute(all_folders_query)
-        all_folders = result.scalars().unique().all()
-        
-        # 2. Получаем корневые заметки
-        root_notes_query = select(Note).where(
-            Note.user_id == user.id,
-            Note.folder_id == None
+
+        folder.parent_id = parent_id
+        folder.path = new_path
+
+    async def _get_folder(self, user: User, folder_id) -> Folder:
+        folder = (await self.db.execute(
+            select(Folder).where(Folder.id == folder_id, Folder.user_id == user.id)
+        )).scalar_one_or_none()
+
+        if not folder:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Folder not found")
+
+        return folder
+
+    async def _folder_path(self, folder: Folder) -> str:
+        """
+        Материализованный путь папки. У папок, созданных до появления path и ещё не заполненных
+        backfill-командой, путь вычисляется по цепочке parent_id и сохраняется при ближайшем commit.
+        """
+        if folder.path is None:
+            row = (await self.db.execute(RESOLVE_PATH_QUERY, {"folder_id": folder.id})).one()
+            if not row.reaches_root:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Folder hierarchy contains a cycle, run python -m app.defs.dashboard.folder_paths"
+                )
+            folder.path = row.path
+
+        return folder.path
+
+    async def get_folder_path(self, user: User, folder_id) -> List[Dict[str, Any]]:
+        """Цепочка папок от корня до указанной (хлебные крошки)"""
+        folder = await self._get_folder(user, folder_id)
+        ids = path_ids(await self._folder_path(folder))
+
+        ancestors = (await self.db.execute(
+            select(Folder.id, Folder.title).where(Folder.id.in_(ids), Folder.user_id == user.id)
+        )).all()
+        titles = {row.id: row.title for row in ancestors}
+
+        return [{"id": str(item_id), "title": titles.get(item_id)} for item_id in ids]
+
+    async def get_subtree(self, user: User, folder_id=None, depth: int = 1) -> List[Dict[str, Any]]:
+        """
+        Содержимое папки (или корня при folder_id=None) на depth уровней вниз, без тел заметок.
+        Каждый уровень - два запроса по индексам parent_id/folder_id, у папок есть children_count,
+        а у папок последнего уровня нет children - их можно раскрыть следующим запросом.
+        """
+        await write_behind.flush_user(user.id)
+        if folder_id is not None:
+            await self._get_folder(user, folder_id)
+
+        containers: Dict[Any, List[Dict[str, Any]]] = {folder_id: []}
+        folder_items: Dict[Any, Dict[str, Any]] = {}
+        frontier = [folder_id]
+
+        for _ in range(depth):
+            if frontier == [None]:
+                folders_filter = Folder.parent_id.is_(None)
+                notes_filter = Note.folder_id.is_(None)
+            else:
+                folders_filter = Folder.parent_id.in_(frontier)
+                notes_filter = Note.folder_id.in_(frontier)
+
+            folders = (await self.db.execute(
+                select(Folder).where(Folder.user_id == user.id, folders_filter)
+            )).scalars().all()
+
+            notes = (await self.db.execute(
+                select(Note)
+                .where(Note.user_id == user.id, notes_filter)
+                .options(load_only(Note.id, Note.title, Note.folder_id, Note.created_at, Note.updated_at))
+            )).scalars().all()
+
+            frontier = []
+            for folder in folders:
+                item = build_folder_item(folder)
+                containers[folder.parent_id].append(item)
+                containers[folder.id] = item["children"]
+                folder_items[folder.id] = item
+                frontier.append(folder.id)
+
+            for note in notes:
+                containers[note.folder_id].append(build_note_item(note, with_content=False))
+
+            if not frontier:
+                break
+
+        if folder_items:
+            ids = list(folder_items)
+            counts = dict.fromkeys(ids, 0)
+
+            for parent_id, count in (await self.db.execute(
+                select(Folder.parent_id, func.count()).where(Folder.parent_id.in_(ids)).group_by(Folder.parent_id)
+            )).all():
+                counts[parent_id] += count
+
+            for parent_id, count in (await self.db.execute(
+                select(Note.folder_id, func.count()).where(Note.folder_id.in_(ids)).group_by(Note.folder_id)
+            )).all():
+                counts[parent_id] += count
+
+            for item_id, item in folder_items.items():
+                item["children_count"] = counts[item_id]
+
+            # Папки последнего уровня не раскрыты
+            for item_id in frontier:
+                del folder_items[item_id]["children"]
+
+        return containers[folder_id]
+
+    async def get_note(self, user: User, source_id) -> Dict[str, Any]:
+        """Get a single note with its content"""
+        await write_behind.flush_note(source_id)
+
+        note = (await self.db.execute(
+            select(Note).where(Note.id == source_id, Note.user_id == user.id)
+        )).scalar_one_or_none()
+
+        if not note:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+
+        return {**build_note_item(note), "revision": note.revision, "version": note.version}
+
+    async def get_backlinks(self, user: User, source_id) -> List[Dict[str, Any]]:
+        """Заметки, ссылающиеся на заметку через @"""
+        exists = (await self.db.execute(
+            select(Note.id).where(Note.id == source_id, Note.user_id == user.id)
+        )).scalar_one_or_none()
+
+        if not exists:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Note not found")
+
+        return await self._linking_notes(user, "note", source_id)
+
+    async def get_folder_backlinks(self, user: User, folder_id) -> List[Dict[str, Any]]:
+        """Заметки, ссылающиеся на папку через #"""
+        await self._get_folder(user, folder_id)
+
+        return await self._linking_notes(user, "folder", folder_id)
+
+    async def _linking_notes(self, user: User, target_type: str, target_id) -> List[Dict[str, Any]]:
+        await write_behind.flush_user(user.id)
+
+        rows = (await self.db.execute(
+            select(Note.id, Note.title, Note.folder_id, Note.created_at, Note.updated_at)
+            .join(NoteLink, NoteLink.source_id == Note.id)
+            .where(
+                NoteLink.user_id == user.id,
+                NoteLink.target_type == target_type,
+                NoteLink.target_id == target_id
+            )
+            .order_by(note_sort_key.desc(), Note.id.desc())
+        )).all()
+
+        return [
+            {**build_note_item(row, with_content=False), "folder_id": str(row.folder_id) if row.folder_id else None}
+            for row in rows
+        ]
+
+    async def get_tree(self, user: User, skeleton: bool = False) -> List[Dict[str, Any]]:
+        """Получить древовидную структуру папок и заметок"""
+        await write_behind.flush_user(user.id)
+
+        # 1. Получаем все папки и все заметки пользователя двумя запросами
+        all_folders = (await self.db.execute(
+            select(Folder).where(Folder.user_id == user.id)
+        )).scalars().all()
+
+        notes_query = select(Note).where(Note.user_id == user.id)
+        if skeleton:
+            # В скелете тела заметок не нужны - не читаем их из БД
+            notes_query = notes_query.options(
+                load_only(Note.id, Note.title, Note.folder_id, Note.created_at, Note.updated_at)
+            )
+        all_notes = (await self.db.execute(notes_query)).scalars().all()
+
+        # 2. Собираем дерево за один проход по индексу parent_id -> children
+        return build_tree(all_folders, all_notes, skeleton=skeleton)
+
+
+    async def list_notes(self, user: User, limit: int = 50, cursor: str = None, order: str = "desc", folder_id=None) -> Dict[str, Any]:
+        """
+        Страница заметок с keyset-пагинацией по (updated_at, id).
+        Стоимость запроса зависит от размера страницы, а не от числа заметок.
+        """
+        await write_behind.flush_user(user.id)
+
+        query = (
+            select(
+                Note.id, Note.title, Note.content, Note.content_codec, Note.content_compressed,
+                Note.folder_id, Note.created_at, Note.updated_at, note_sort_key.label("sort_key")
+            )
+            .where(Note.user_id == user.id)
         )
-        
-        result = await self.db.execute(root_notes_query)
-        root_notes = result.scalars().all()
-        
-        # 3. Создаём индекс папок по ID для быстрого поиска
-        folders_by_id = {folder.id: folder for folder in all_folders}
-        
-        # 4. Рекурсивно строим дерево
-        def build_folder_tree(folder_id: UUID) -> Dict[str, Any]:
-            folder = folders_by_id.get(folder_id)
-            if not folder:
-                return None
-            
-            # Находим дочерние папки (у которых parent_id == folder_id)
-            children_folders = [
-                f for f in all_folders 
-                if f.parent_id == folder_id
+
+        if folder_id is not None:
+            query = query.where(Note.folder_id == folder_id)
+
+        if cursor:
+            sort_value, note_id = decode_cursor(cursor, 2)
+            try:
+                after = (datetime.fromisoformat(sort_value), uuid.UUID(note_id))
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+            if order == "desc":
+                query = query.where(tuple_(note_sort_key, Note.id) < after)
+            else:
+                query = query.where(tuple_(note_sort_key, Note.id) > after)
+
+        if order == "desc":
+            query = query.order_by(note_sort_key.desc(), Note.id.desc())
+        else:
+            query = query.order_by(note_sort_key.asc(), Note.id.asc())
+
+        rows = (await self.db.execute(query.limit(limit + 1))).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].sort_key.isoformat(), rows[-1].id)
+
+        return {
+            "items": [
+                {
+                    **build_note_item(row),
+                    "folder_id": str(row.folder_id) if row.folder_id else None
+                }
+                for row in rows
+            ],
+            "next_cursor": next_cursor
+        }
+
+    async def search_notes(self, user: User, q: str, limit: int = 20, cursor: str = None) -> Dict[str, Any]:
+        """Полнотекстовый поиск по заголовку и тексту заметок, страницы по (rank, id)"""
+        await write_behind.flush_user(user.id)
+
+        after_rank = after_id = None
+        if cursor:
+            after_rank, after_id = decode_cursor(cursor, 2)
+            try:
+                after_rank, after_id = float(after_rank), uuid.UUID(after_id)
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+        rows = (await self.db.execute(SEARCH_NOTES_QUERY, {
+            "q": q,
+            "user_id": user.id,
+            "after_rank": after_rank,
+            "after_id": after_id,
+            "limit": limit + 1
+        })).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].rank, rows[-1].id)
+
+        # У сжатых заметок фрагмент считается по распакованному тексту, одним запросом на страницу
+        snippets = {row.id: row.snippet for row in rows}
+        packed = [row for row in rows if row.content_codec is not None]
+        if packed:
+            texts = [
+                search_text(decode_content(None, row.content_codec, row.content_compressed))
+                for row in packed
             ]
-            
-            # Заметки в этой папке
-            children_notes = folder.notes if folder.notes else []
-            
-            return {
-                "id": str(folder.id),
-                "title": folder.title,
-                "type": "folder",
-                "created_at": folder.created_at.isoformat() if folder.created_at else None,
-                "updated_at": folder.updated_at.isoformat() if folder.updated_at else None,
-                "children": [
-                    *[build_folder_tree(child.id) for child in children_folders],
-                    *[build_note_item(note) for note in children_notes]
-                ]
-            }
-        
-        def build_note_item(note: Note) -> Dict[str, Any]:
-            return {
-                "id": str(note.id),
-                "title": note.title,
-                "content": note.content,
-                "type": "note",
-                "created_at": note.created_at.isoformat() if note.created_at else None,
-                "updated_at": note.updated_at.isoformat() if note.updated_at else None
+            headlines = (await self.db.execute(HEADLINE_QUERY, {"q": q, "texts": texts})).scalars().all()
+            snippets.update(zip([row.id for row in packed], headlines))
+
+        return {
+            "items": [
+                {
+                    **build_note_item(row, with_content=False),
+                    "folder_id": str(row.folder_id) if row.folder_id else None,
+                    "snippet": snippets[row.id],
+                    "rank": row.rank
+                }
+                for row in rows
+            ],
+            "next_cursor": next_cursor
+        }
+
+    async def autocomplete(self, user: User, q: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Лучшие совпадения среди заголовков заметок и папок для быстрого перехода"""
+        await write_behind.flush_user(user.id)
+
+        escaped = escape_like(q)
+
+        rows = (await self.db.execute(AUTOCOMPLETE_QUERY, {
+            "q": q,
+            "user_id": user.id,
+            "contains": f"%{escaped}%",
+            "prefix": f"{escaped}%",
+            "limit": limit
+        })).all()
+
+        return [
+            {
+                "id": str(row.id),
+                "title": row.title,
+                "type": row.type,
+                "parent_id": str(row.parent_id) if row.parent_id else None,
+                "score": row.score
             }
-        
-        # 5. Формируем итоговое дерево - только корневые папки
-        root_folders = [f for f in all_folders if f.parent_id is None]
-        
-        tree = [
-            *[build_folder_tree(folder.id) for folder in root_folders],
-            *[build_note_item(note) for note in root_notes]
+            for row in rows
         ]
-        
-        return tree
\ No newline at end of file
+
+    async def iter_tree_nodes(self, user: User, skeleton: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Плоский поток узлов дерева через серверный курсор: сначала папки (родители раньше детей),
+        затем заметки. Вложенность восстанавливается по parent_id/folder_id.
+        """
+        user_id = user.id
+        await write_behind.flush_user(user_id)
+
+        folder_columns = (Folder.id, Folder.title, Folder.parent_id, Folder.created_at, Folder.updated_at)
+        note_columns = (Note.id, Note.title, Note.folder_id, Note.created_at, Note.updated_at)
+        if not skeleton:
+            note_columns += (Note.content, Note.content_codec, Note.content_compressed)
+
+        async with AsyncSessionLocal() as session:
+            folders = await session.stream(
+                select(*folder_columns)
+                .where(Folder.user_id == user_id)
+                .order_by(Folder.path)
+                .execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            async for folder in folders:
+                yield {
+                    **build_folder_item(folder, with_children=False),
+                    "parent_id": str(folder.parent_id) if folder.parent_id else None
+                }
+
+            notes = await session.stream(
+                select(*note_columns)
+                .where(Note.user_id == user_id)
+                .execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            async for note in notes:
+                yield {
+                    **build_note_item(note, with_content=not skeleton),
+                    "folder_id": str(note.folder_id) if note.folder_id else None
+                }
+
+    async def iter_notes(self, user: User) -> AsyncIterator[Dict[str, Any]]:
+        """Все заметки пользователя через серверный курсор"""
+        user_id = user.id
+        await write_behind.flush_user(user_id)
+
+        async with AsyncSessionLocal() as session:
+            notes = await session.stream(
+                select(
+                    Note.id, Note.title, Note.content, Note.content_codec, Note.content_compressed,
+                    Note.folder_id, Note.created_at, Note.updated_at
+                )
+                .where(Note.user_id == user_id)
+                .execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            async for note in notes:
+                yield {
+                    **build_note_item(note),
+                    "folder_id": str(note.folder_id) if note.folder_id else None
+                }
+
+    async def export_zip(self, user: User) -> AsyncIterator[bytes]:
+        """ZIP со всеми заметками пользователя, см. export.py"""
+        user_id = user.id
+        await write_behind.flush_user(user_id)
+
+        async with AsyncSessionLocal() as session:
+            async for chunk in iter_vault_zip(session, user_id):
+                yield chunk
+
+    async def import_notes(self, user: User, entries: Iterable[ImportEntry], folder_id=None) -> AsyncIterator[Dict[str, int]]:
+        """
+        Создаёт папки и заметки из файлов импорта (см. importer.py) внутри folder_id или в корне.
+
+        Строки вставляются многострочными INSERT ... VALUES (insert_rows), каждые
+        IMPORT_BATCH_SIZE заметок - отдельная транзакция с одной ревизией дерева.
+        COPY здесь не подходит: content_vector считается выражением to_tsvector при вставке. После каждой транзакции
+        отдаётся прогресс: сколько папок и заметок создано и сколько файлов пропущено.
+        """
+        parent_path = None
+        if folder_id:
+            parent_path = await self._folder_path(await self._get_folder(user, folder_id))
+
+        folders: Dict[Tuple[str, ...], Tuple[Any, str]] = {(): (folder_id, parent_path)}
+        folder_rows: List[Dict[str, Any]] = []
+        note_rows: List[Dict[str, Any]] = []
+        contents: Dict[Any, str] = {}
+        progress = {"folders": 0, "notes": 0, "skipped": 0}
+
+        def folder_for(parts: List[str]):
+            key = ()
+            for part in parts:
+                parent_key, key = key, key + (part,)
+                if key not in folders:
+                    new_id = uuid.uuid4()
+                    parent_id, path = folders[parent_key]
+                    folders[key] = (new_id, folder_path(path, new_id))
+                    folder_rows.append({
+                        "id": new_id,
+                        "title": part[:50],
+                        "user_id": user.id,
+                        "parent_id": parent_id,
+                        "path": folders[key][1]
+                    })
+            return folders[key][0]
+
+        async def flush() -> None:
+            revision = await self._bump_revision(user.id)
+            # Родительские папки идут в списке раньше вложенных, а заметки вставляются после папок
+            await insert_rows(self.db, Folder, [{**row, "revision": revision} for row in folder_rows])
+            if note_rows:
+                await insert_rows(self.db, Note, [{**row, "revision": revision} for row in note_rows])
+                await self._sync_note_links(user.id, contents, replace=False)
+            await self.db.commit()
+            tree_cache.invalidate(user.id)
+
+            progress["folders"] += len(folder_rows)
+            progress["notes"] += len(note_rows)
+            folder_rows.clear()
+            note_rows.clear()
+            contents.clear()
+
+        for parts, name, size, read in entries:
+            title = note_title(name)
+            if title is None or size > settings.IMPORT_MAX_NOTE_BYTES:
+                progress["skipped"] += 1
+                continue
+
+            content = decode_note(read())
+            note_id = uuid.uuid4()
+            contents[note_id] = content
+            note_rows.append({
+                **encode_content(content),
+                "id": note_id,
+                "title": title or content[:50],
+                "user_id": user.id,
+                "folder_id": folder_for(parts)
+            })
+
+            if len(note_rows) >= settings.IMPORT_BATCH_SIZE:
+                await flush()
+                yield dict(progress)
+
+        if note_rows:
+            await flush()
+        yield dict(progress)
+
+    async def import_archive(self, user: User, archive, folder_id=None) -> AsyncIterator[Dict[str, int]]:
+        """
+        Проверяет загруженный ZIP и папку назначения и возвращает поток прогресса импорта.
+        Импорт идёт в отдельной сессии, потому что читается уже после ответа на запрос.
+        Файл archive закрывается по окончании импорта.
+        """
+        try:
+            if folder_id:
+                await self._get_folder(user, folder_id)
+            if not zipfile.is_zipfile(archive):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="NotZIPFormat")
+        except Exception:
+            archive.close()
+            raise
+
+        async def progress() -> AsyncIterator[Dict[str, int]]:
+            try:
+                async with AsyncSessionLocal() as session:
+                    with zipfile.ZipFile(archive) as source:
+                        async for step in Dashboard(session).import_notes(user, iter_zip_entries(source), folder_id):
+                            yield step
+            finally:
+                archive.close()
+
+        return progress()
+
+    async def get_tree_json(self, user: User, skeleton: bool = False, revision: int = None) -> bytes:
+        """Сериализованное дерево из кэша или собранное заново для текущей ревизии"""
+        if revision is None:
+            revision = await self.get_revision(user)
+
+        payload = tree_cache.get(user.id, skeleton, revision)
+        if payload is None:
+            payload = json.dumps(await self.get_tree(user, skeleton=skeleton), ensure_ascii=False).encode()
+            tree_cache.set(user.id, skeleton, revision, payload)
+
+        return payload
+
+    async def stream_tree(self, user: User, skeleton: bool = False, revision: int = None) -> AsyncIterator[bytes]:
+        """Дерево целиком, собранное в Postgres, в виде потока JSON-байтов"""
+        user_id = user.id
+        if revision is None:
+            revision = await self.get_revision(user)
+
+        payload = tree_cache.get(user_id, skeleton, revision)
+        if payload is not None:
+            yield payload
+            return
+
+        # Куски копятся для кэша, только пока дерево в него помещается: большое дерево
+        # (и любое при выключенном кэше) отдаётся потоком, не собираясь в памяти
+        limit = tree_cache.payload_limit()
+        chunks = [] if limit > 0 else None
+        size = 0
+
+        # Сессия из get_db закрывается до отдачи тела ответа, поэтому поток открывает свою
+        async with AsyncSessionLocal() as session:
+            async for chunk in stream_tree_json(session, user_id, skeleton=skeleton):
+                if chunks is not None:
+                    size += len(chunk)
+                    if size > limit:
+                        chunks = None
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+
+        if chunks is not None:
+            tree_cache.set(user_id, skeleton, revision, b"".join(chunks))
+
+
+    async def get_revision(self, user: User) -> int:
+        """Текущая ревизия дерева пользователя; отложенные правки перед этим записываются"""
+        await write_behind.flush_user(user.id)
+
+        return (await self.db.execute(
+            select(User.tree_revision).where(User.id == user.id)
+        )).scalar_one()
+
+    async def get_changes(self, user: User, since: int) -> Dict[str, Any]:
+        """
+        Изменения дерева после ревизии since: созданные, изменённые и перемещённые
+        папки и заметки (без content) и надгробия удалённых.
+        """
+        revision = await self.get_revision(user)
+
+        folders = (await self.db.execute(
+            select(Folder)
+            .where(Folder.user_id == user.id, Folder.revision > since)
+            .order_by(Folder.revision)
+        )).scalars().all()
+
+        notes = (await self.db.execute(
+            select(Note)
+            .where(Note.user_id == user.id, Note.revision > since)
+            .options(load_only(Note.id, Note.title, Note.folder_id, Note.revision, Note.created_at, Note.updated_at))
+            .order_by(Note.revision)
+        )).scalars().all()
+
+        tombstones = (await self.db.execute(
+            select(TreeTombstone)
+            .where(TreeTombstone.user_id == user.id, TreeTombstone.revision > since)
+            .order_by(TreeTombstone.revision)
+        )).scalars().all()
+
+        return {
+            "revision": revision,
+            "folders": [
+                {
+                    **build_folder_item(folder, with_children=False),
+                    "parent_id": str(folder.parent_id) if folder.parent_id else None,
+                    "revision": folder.revision
+                }
+                for folder in folders
+            ],
+            "notes": [
+                {
+                    **build_note_item(note, with_content=False),
+                    "folder_id": str(note.folder_id) if note.folder_id else None,
+                    "revision": note.revision
+                }
+                for note in notes
+            ],
+            "deleted": [
+                {
+                    "id": str(tombstone.item_id),
+                    "type": tombstone.item_type,
+                    "revision": tombstone.revision
+                }
+                for tombstone in tombstones
+            ]
+        }
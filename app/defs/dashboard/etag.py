@@ -0,0 +1,33 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+
+def make_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Ожидаемая версия из заголовка If-Match; None - условия нет (отсутствует или "*").
+    Слабый тег (W/"n") не подходит для строгого сравнения версий и отклоняется.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+
+    value = if_match.strip()
+    if value.startswith("W/"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Weak ETag is not allowed in If-Match")
+
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid If-Match header")
+
+
+def version_conflict(current_version: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Item was modified by another request",
+        headers={"ETag": make_etag(current_version)}
+    )
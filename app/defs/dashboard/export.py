@@ -0,0 +1,152 @@
+"""
+Экспорт всех заметок пользователя в ZIP с Markdown-файлами.
+
+Архив пишется в неперематываемый буфер (zipfile в этом случае ставит data descriptor
+после каждого файла) и отдаётся частями по мере чтения строк из серверного курсора.
+В памяти держатся только имена папок и текущая заметка, а также оглавление архива,
+которое zipfile копит до конца записи.
+"""
+import io
+import re
+import zipfile
+from collections import defaultdict
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional, Set
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.defs.dashboard.compression import note_content
+from app.defs.dashboard.streaming import STREAM_BATCH_SIZE, STREAM_CHUNK_SIZE
+from app.models.database import Folder, Note
+
+NOTE_EXTENSION = ".md"
+MAX_NAME_LENGTH = 100
+UNTITLED = "Untitled"
+
+_UNSAFE_CHARS = re.compile(r'[\x00-\x1f\x7f/\\:*?"<>|]')
+
+
+class ZipStream(io.RawIOBase):
+    """Приёмник для zipfile: записанные байты копятся, пока их не заберут через drain()"""
+
+    def __init__(self) -> None:
+        # Один bytearray вместо списка кусков: zipfile пишет заголовки мелкими порциями,
+        # и на каждую из них иначе уходил бы отдельный объект bytes
+        self._buffer = bytearray()
+
+    @property
+    def size(self) -> int:
+        return len(self._buffer)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def safe_name(title: Optional[str]) -> str:
+    """Имя файла или папки из заголовка, допустимое во всех распространённых ФС"""
+    name = _UNSAFE_CHARS.sub("_", title or "").strip(" .")
+    return name[:MAX_NAME_LENGTH] or UNTITLED
+
+
+def unique_name(taken: Set[str], base: str, extension: str = "") -> str:
+    """Имя, ещё не занятое в каталоге (без учёта регистра): "Заметка (2).md" и т.д."""
+    name = base + extension
+    number = 2
+    while name.lower() in taken:
+        name = f"{base} ({number}){extension}"
+        number += 1
+    taken.add(name.lower())
+    return name
+
+
+def zip_entry(name: str, row) -> zipfile.ZipInfo:
+    stamp = row.updated_at or row.created_at
+    date_time = stamp.timetuple()[:6] if stamp and stamp.year >= 1980 else (1980, 1, 1, 0, 0, 0)
+    info = zipfile.ZipInfo(name, date_time)
+    if name.endswith("/"):
+        info.external_attr = (0o40755 << 16) | 0x10
+    else:
+        info.external_attr = 0o644 << 16
+        info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+async def iter_vault_zip(db: AsyncSession, user_id: int) -> AsyncIterator[bytes]:
+    """ZIP-архив папок и заметок пользователя, отдаваемый кусками по ~STREAM_CHUNK_SIZE байт"""
+    folders = await db.stream(
+        select(Folder.id, Folder.parent_id, Folder.title, Folder.created_at, Folder.updated_at)
+        .where(Folder.user_id == user_id)
+        .order_by(Folder.path)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+
+    async def notes() -> AsyncIterator[Any]:
+        # Запрос заметок выполняется только после того, как все папки прочитаны
+        rows = await db.stream(
+            select(
+                Note.title, Note.content, Note.content_codec, Note.content_compressed,
+                Note.folder_id, Note.created_at, Note.updated_at
+            )
+            .where(Note.user_id == user_id)
+            .order_by(Note.folder_id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        async for row in rows:
+            yield row
+
+    async for chunk in write_vault_zip(folders, notes()):
+        yield chunk
+
+
+async def write_vault_zip(folders: AsyncIterable[Any], notes: AsyncIterable[Any]) -> AsyncIterator[bytes]:
+    """
+    Пишет ZIP из строк папок и заметок, отдавая его кусками по ~STREAM_CHUNK_SIZE байт.
+
+    Папки должны идти в порядке материализованного пути, чтобы родитель всегда
+    встречался раньше вложенных. Заметки должны идти сгруппированными по папкам,
+    тогда для проверки совпадающих имён нужен только список имён текущей папки.
+    """
+    sink = ZipStream()
+    directories: Dict[UUID, str] = {}
+    taken: Dict[str, Set[str]] = defaultdict(set)
+
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        async for folder in folders:
+            # Папка, чей родитель не встретился раньше (путь не заполнен), попадает в корень архива
+            parent = directories.get(folder.parent_id, "")
+            directory = parent + unique_name(taken[parent], safe_name(folder.title)) + "/"
+            directories[folder.id] = directory
+            archive.writestr(zip_entry(directory, folder), b"")
+
+            if sink.size >= STREAM_CHUNK_SIZE:
+                yield sink.drain()
+
+        current_directory = None
+        async for note in notes:
+            directory = directories.get(note.folder_id, "")
+            if directory != current_directory:
+                # Имена закончившейся папки больше не понадобятся; корень может встретиться
+                # ещё раз (заметки из папок с незаполненным путём), его имена храним до конца
+                if current_directory:
+                    taken.pop(current_directory, None)
+                current_directory = directory
+                current_taken = taken[directory]
+
+            name = unique_name(current_taken, safe_name(note.title), NOTE_EXTENSION)
+            with archive.open(zip_entry(directory + name, note), "w") as entry:
+                entry.write(note_content(note).encode())
+
+            if sink.size >= STREAM_CHUNK_SIZE:
+                yield sink.drain()
+
+    yield sink.drain()
@@ -0,0 +1,91 @@
+"""
+Материализованный путь папок: "/<id корня>/.../<id папки>/" (uuid в hex).
+
+Поддерево папки - это все папки, чей путь начинается с её пути, поэтому
+подзапросы по иерархии сводятся к префиксному поиску по индексу ix_folders_path.
+
+Заполнение путей для уже существующих папок:
+    python -m app.defs.dashboard.folder_paths
+До заполнения путь папки без path вычисляется по цепочке parent_id (RESOLVE_PATH_QUERY).
+"""
+import asyncio
+from typing import List, Optional
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+
+PATH_SEPARATOR = "/"
+SEGMENT_LENGTH = 32 + len(PATH_SEPARATOR)
+
+BACKFILL_QUERY = text("""
+WITH RECURSIVE walk AS (
+    SELECT id, '/' || replace(id::text, '-', '') || '/' AS path
+    FROM folders
+    WHERE parent_id IS NULL
+    UNION ALL
+    SELECT f.id, w.path || replace(f.id::text, '-', '') || '/'
+    FROM folders f
+    JOIN walk w ON f.parent_id = w.id
+)
+UPDATE folders
+SET path = walk.path
+FROM walk
+WHERE folders.id = walk.id AND folders.path IS DISTINCT FROM walk.path
+""")
+
+# Путь одной папки по цепочке parent_id; reaches_root = false, если цепочка зациклена
+RESOLVE_PATH_QUERY = text("""
+WITH RECURSIVE up AS (
+    SELECT id, parent_id, 1 AS depth, ARRAY[id] AS seen
+    FROM folders
+    WHERE id = :folder_id
+    UNION ALL
+    SELECT f.id, f.parent_id, up.depth + 1, up.seen || f.id
+    FROM folders f
+    JOIN up ON f.id = up.parent_id
+    WHERE NOT f.id = ANY(up.seen)
+)
+SELECT
+    '/' || string_agg(replace(id::text, '-', ''), '/' ORDER BY depth DESC) || '/' AS path,
+    coalesce(bool_or(parent_id IS NULL), false) AS reaches_root
+FROM up
+""")
+
+
+def folder_path(parent_path: Optional[str], folder_id) -> str:
+    return (parent_path or PATH_SEPARATOR) + UUID(str(folder_id)).hex + PATH_SEPARATOR
+
+
+def subtree_pattern(path: str) -> str:
+    """LIKE-шаблон поддерева (сама папка и все потомки)"""
+    return path + "%"
+
+
+def path_depth(path: str) -> int:
+    """Глубина папки: 1 для корневых"""
+    return (len(path) - len(PATH_SEPARATOR)) // SEGMENT_LENGTH
+
+
+def path_ids(path: str) -> List[UUID]:
+    """id всех папок на пути от корня до папки включительно"""
+    return [UUID(hex=segment) for segment in path.strip(PATH_SEPARATOR).split(PATH_SEPARATOR) if segment]
+
+
+async def backfill_folder_paths(db: AsyncSession) -> int:
+    """Пересчитывает пути всех папок, достижимых от корня. Возвращает число обновлённых строк"""
+    result = await db.execute(BACKFILL_QUERY)
+    await db.commit()
+    return result.rowcount
+
+
+async def main() -> None:
+    async with AsyncSessionLocal() as session:
+        updated = await backfill_folder_paths(session)
+    print(f"Folder paths updated: {updated}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
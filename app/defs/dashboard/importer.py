@@ -0,0 +1,96 @@
+"""
+Импорт Markdown-файлов из ZIP-архива или каталога: вложенные каталоги становятся папками,
+файлы - заметками. Сама запись в БД - Dashboard.import_notes.
+
+Импорт из командной строки:
+    python -m app.defs.dashboard.importer <user_id> <архив.zip | каталог> [--folder <id папки>]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Callable, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+
+NOTE_EXTENSIONS = (".md", ".markdown", ".txt")
+TITLE_LENGTH = 50
+
+# (каталоги от корня импорта, имя файла, размер в байтах, чтение содержимого)
+ImportEntry = Tuple[List[str], str, int, Callable[[], bytes]]
+
+
+def _is_hidden(parts: List[str]) -> bool:
+    """Служебные файлы и каталоги: .git, .obsidian, __MACOSX и т.п."""
+    return any(part.startswith(".") or part == "__MACOSX" for part in parts)
+
+
+def iter_zip_entries(archive: zipfile.ZipFile) -> Iterator[ImportEntry]:
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+
+        parts = [part for part in PurePosixPath(info.filename).parts if part not in ("/", ".", "..")]
+        if not parts or _is_hidden(parts):
+            continue
+
+        yield parts[:-1], parts[-1], info.file_size, lambda info=info: archive.read(info)
+
+
+def iter_directory_entries(root: str) -> Iterator[ImportEntry]:
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        relative = os.path.relpath(directory, root)
+        parts = [] if relative == "." else relative.split(os.sep)
+
+        for name in sorted(files):
+            if _is_hidden(parts + [name]):
+                continue
+            path = Path(directory, name)
+            yield parts, name, path.stat().st_size, path.read_bytes
+
+
+def note_title(file_name: str) -> Optional[str]:
+    """Заголовок заметки из имени файла; None, если файл не похож на заметку"""
+    stem, extension = os.path.splitext(file_name)
+    if extension.lower() not in NOTE_EXTENSIONS:
+        return None
+    return stem[:TITLE_LENGTH]
+
+
+def decode_note(data: bytes) -> str:
+    return data.decode("utf-8-sig", errors="replace")
+
+
+async def main() -> None:
+    from app.defs.dashboard.defs import Dashboard
+    from app.models.database import User
+
+    parser = argparse.ArgumentParser(description="Импорт Markdown-файлов в заметки пользователя")
+    parser.add_argument("user_id", type=int)
+    parser.add_argument("source", help="ZIP-архив или каталог")
+    parser.add_argument("--folder", type=UUID, default=None, help="папка, в которую импортировать")
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as session:
+        user = (await session.execute(select(User).where(User.id == args.user_id))).scalar_one_or_none()
+        if not user:
+            raise SystemExit(f"User {args.user_id} not found")
+
+        with contextlib.ExitStack() as stack:
+            if os.path.isdir(args.source):
+                entries = iter_directory_entries(args.source)
+            else:
+                entries = iter_zip_entries(stack.enter_context(zipfile.ZipFile(args.source)))
+
+            async for step in Dashboard(session).import_notes(user, entries, args.folder):
+                print(f"Folders: {step['folders']}, notes: {step['notes']}, skipped: {step['skipped']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""
+Ссылки между заметками: "@<id заметки>" ссылается на заметку, "#<id папки>" - на папку.
+Id вставляет редактор (например, из подсказок /dashboard/autocomplete), поэтому
+ссылка однозначна и не зависит от переименований.
+
+Заполнение note_links для уже существующих заметок:
+    python -m app.defs.dashboard.links
+"""
+import asyncio
+import re
+from typing import Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal, insert_rows
+from app.defs.dashboard.compression import note_content
+from app.defs.dashboard.streaming import STREAM_BATCH_SIZE
+from app.models.database import Note, NoteLink
+
+LINK_TYPES = {"@": "note", "#": "folder"}
+
+_LINK_PATTERN = re.compile(
+    r"(?<![\w@#])([@#])([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(?![\w-])",
+    re.IGNORECASE
+)
+# Блоки кода (``` или ~~~, незакрытый - до конца текста) и `код` в строке: ссылки в них не считаются
+_CODE_PATTERN = re.compile(r"^(```|~~~).*?(?:^\1|\Z)|`[^`\n]+`", re.DOTALL | re.MULTILINE)
+
+
+def parse_links(content: str, source_id=None) -> Set[Tuple[str, UUID]]:
+    """Множество (тип цели, id цели) всех ссылок в тексте, кроме ссылки заметки source_id на саму себя"""
+    text = _CODE_PATTERN.sub(" ", content or "")
+    links = {(LINK_TYPES[sigil], UUID(target)) for sigil, target in _LINK_PATTERN.findall(text)}
+    if source_id is not None:
+        links.discard(("note", UUID(str(source_id))))
+    return links
+
+
+async def backfill_note_links(db: AsyncSession, reader: AsyncSession) -> int:
+    """Пересобирает note_links по текстам всех заметок. Возвращает число ссылок"""
+    await db.execute(delete(NoteLink))
+
+    total = 0
+    rows = []
+    notes = await reader.stream(
+        select(Note.id, Note.user_id, Note.content, Note.content_codec, Note.content_compressed)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    async for note in notes:
+        rows.extend(
+            {"source_id": note.id, "user_id": note.user_id, "target_type": target_type, "target_id": target_id}
+            for target_type, target_id in parse_links(note_content(note), note.id)
+        )
+        if len(rows) >= STREAM_BATCH_SIZE:
+            await insert_rows(db, NoteLink, rows)
+            total += len(rows)
+            rows.clear()
+
+    if rows:
+        await insert_rows(db, NoteLink, rows)
+        total += len(rows)
+
+    await db.commit()
+    return total
+
+
+async def main() -> None:
+    # Заметки читаются серверным курсором в отдельной сессии, пока в основной идут вставки
+    async with AsyncSessionLocal() as session, AsyncSessionLocal() as reader:
+        total = await backfill_note_links(session, reader)
+    print(f"Note links created: {total}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
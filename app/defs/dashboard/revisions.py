@@ -0,0 +1,39 @@
+import json
+from typing import Sequence
+
+from app.config import settings
+from app.defs.dashboard.text_patch import apply_patch, make_patch
+from app.models.database import NoteRevision
+
+SNAPSHOT = "snapshot"
+DIFF = "diff"
+
+
+def revision_kind(diffs_since_snapshot: int) -> str:
+    """Снимок, если выше последнего снимка уже накопилось достаточно патчей"""
+    return SNAPSHOT if diffs_since_snapshot + 1 >= settings.NOTE_REVISION_SNAPSHOT_EVERY else DIFF
+
+
+def revision_data(kind: str, old_content: str, new_content: str) -> str:
+    """Полный текст для снимка или обратный патч new -> old для diff"""
+    if kind == SNAPSHOT:
+        return old_content
+    return json.dumps(make_patch(new_content, old_content), ensure_ascii=False, separators=(",", ":"))
+
+
+def reconstruct(head_content: str, revisions: Sequence[NoteRevision]) -> str:
+    """
+    Восстанавливает текст самой старой из revisions.
+
+    revisions - непрерывный отрезок истории от нужной версии вверх, отсортированный
+    по убыванию версии и начинающийся со снимка (или с версии, следующей за которой идёт
+    текущий текст заметки head_content). Длина отрезка ограничена интервалом снимков,
+    поэтому стоимость не зависит от длины всей истории.
+    """
+    content = head_content
+    for revision in revisions:
+        if revision.kind == SNAPSHOT:
+            content = revision.data
+        else:
+            content = apply_patch(content, json.loads(revision.data))
+    return content
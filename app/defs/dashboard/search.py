@@ -0,0 +1,141 @@
+"""
+Полнотекстовый поиск и автодополнение заголовков.
+
+Заполнение notes.content_vector для заметок, сохранённых до его появления:
+    python -m app.defs.dashboard.search
+"""
+import asyncio
+
+from sqlalchemy import bindparam, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.defs.dashboard.compression import note_content
+from app.defs.dashboard.streaming import STREAM_BATCH_SIZE
+from app.models.database import SEARCH_CONFIG, Note
+
+
+def _headline(content: str, query: str) -> str:
+    # Текст экранируется до подсветки, поэтому единственная разметка в snippet - <mark>
+    return f"""ts_headline(
+        '{SEARCH_CONFIG}',
+        replace(replace(replace({content}, '&', '&amp;'), '<', '&lt;'), '>', '&gt;'),
+        {query},
+        'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5'
+    )"""
+
+
+# Ранжирование и фильтрация идут по GIN-индексу ix_notes_search_vector,
+# а фрагменты с подсветкой (дорогой ts_headline) считаются только для строк страницы.
+# В notes.content у сжатых заметок только начало текста, поэтому для них вместо snippet
+# отдаётся сжатый текст, а фрагмент считает HEADLINE_QUERY по распакованному.
+SEARCH_NOTES_QUERY = text(f"""
+WITH query AS (
+    SELECT websearch_to_tsquery('{SEARCH_CONFIG}', :q) AS q
+),
+page AS (
+    SELECT n.id, ts_rank_cd(n.search_vector, query.q) AS rank
+    FROM notes n, query
+    WHERE n.user_id = :user_id
+      AND n.search_vector @@ query.q
+      AND (
+          CAST(:after_rank AS real) IS NULL
+          OR (ts_rank_cd(n.search_vector, query.q), n.id) < (CAST(:after_rank AS real), CAST(:after_id AS uuid))
+      )
+    ORDER BY rank DESC, n.id DESC
+    LIMIT :limit
+)
+SELECT
+    n.id,
+    n.title,
+    n.folder_id,
+    n.created_at,
+    n.updated_at,
+    page.rank,
+    n.content_codec,
+    CASE WHEN n.content_codec IS NOT NULL THEN n.content_compressed END AS content_compressed,
+    CASE WHEN n.content_codec IS NULL THEN {_headline("n.content", "query.q")} END AS snippet
+FROM page
+JOIN notes n ON n.id = page.id, query
+ORDER BY page.rank DESC, n.id DESC
+""")
+
+# Фрагменты с подсветкой для переданных текстов, в том же порядке
+HEADLINE_QUERY = text(f"""
+SELECT {_headline("t.content", f"websearch_to_tsquery('{SEARCH_CONFIG}', :q)")} AS snippet
+FROM unnest(CAST(:texts AS text[])) WITH ORDINALITY AS t(content, position)
+ORDER BY t.position
+""")
+
+
+# Быстрый переход по заголовку: ILIKE и word_similarity (<%) обслуживаются триграммными
+# GIN-индексами ix_notes_title_trgm и ix_folders_title_trgm. Сначала совпадения по префиксу,
+# затем по похожести, короткие заголовки выше длинных.
+AUTOCOMPLETE_QUERY = text("""
+WITH matches AS (
+    SELECT id, title, 'note' AS type, folder_id AS parent_id
+    FROM notes
+    WHERE user_id = :user_id AND (title ILIKE :contains OR :q <% title)
+    UNION ALL
+    SELECT id, title, 'folder' AS type, parent_id
+    FROM folders
+    WHERE user_id = :user_id AND (title ILIKE :contains OR :q <% title)
+)
+SELECT
+    id,
+    title,
+    type,
+    parent_id,
+    title ILIKE :prefix AS is_prefix,
+    word_similarity(:q, title) AS score
+FROM matches
+ORDER BY is_prefix DESC, score DESC, length(title), id
+LIMIT :limit
+""")
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# updated_at присваивается сам себе, чтобы заполнение индекса не меняло порядок заметок
+BACKFILL_STATEMENT = (
+    update(Note.__table__)
+    .where(Note.__table__.c.id == bindparam("note_id"))
+    .values(content_vector=bindparam("content"), updated_at=Note.__table__.c.updated_at)
+)
+
+
+async def backfill_content_vectors(db: AsyncSession, reader: AsyncSession) -> int:
+    """Заполняет content_vector у заметок, где он пуст. Возвращает число обновлённых заметок"""
+    total = 0
+    rows = []
+    notes = await reader.stream(
+        select(Note.id, Note.content, Note.content_codec, Note.content_compressed)
+        .where(Note.content_vector.is_(None))
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    async for note in notes:
+        rows.append({"note_id": note.id, "content": note_content(note)})
+        if len(rows) >= STREAM_BATCH_SIZE:
+            await db.execute(BACKFILL_STATEMENT, rows)
+            await db.commit()
+            total += len(rows)
+            rows.clear()
+
+    if rows:
+        await db.execute(BACKFILL_STATEMENT, rows)
+        await db.commit()
+        total += len(rows)
+
+    return total
+
+
+async def main() -> None:
+    # Заметки читаются серверным курсором в отдельной сессии, пока в основной идут обновления
+    async with AsyncSessionLocal() as session, AsyncSessionLocal() as reader:
+        total = await backfill_content_vectors(session, reader)
+    print(f"Notes indexed: {total}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
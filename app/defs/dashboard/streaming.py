@@ -0,0 +1,46 @@
+import json
+from typing import Any, AsyncIterator, Dict
+
+# Сколько строк забирать из серверного курсора за раз и сколько байт копить перед отправкой
+STREAM_BATCH_SIZE = 500
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _dumps(item: Dict[str, Any]) -> str:
+    return json.dumps(item, ensure_ascii=False, default=str)
+
+
+async def iter_json_lines(items: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """NDJSON: по одному объекту на строку"""
+    buffer = []
+    size = 0
+    async for item in items:
+        line = _dumps(item) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= STREAM_CHUNK_SIZE:
+            yield "".join(buffer).encode()
+            buffer.clear()
+            size = 0
+
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+async def iter_json_array(items: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Обычный JSON-массив, отдаваемый частями по мере чтения строк"""
+    buffer = ["["]
+    size = 1
+    separator = ""
+    async for item in items:
+        part = separator + _dumps(item)
+        separator = ","
+        buffer.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_SIZE:
+            yield "".join(buffer).encode()
+            buffer.clear()
+            size = 0
+
+    buffer.append("]")
+    yield "".join(buffer).encode()
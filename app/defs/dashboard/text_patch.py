@@ -0,0 +1,64 @@
+"""
+Компактный формат правок текста заметки.
+
+Патч - список операций, применяемых к базовому тексту слева направо:
+    целое > 0  - оставить столько символов,
+    целое < 0  - удалить столько символов,
+    строка     - вставить строку.
+Непокрытый операциями хвост базового текста сохраняется.
+Позиции считаются в символах Unicode (code points), а не в UTF-16.
+
+Например, [7, -5, "мир"] превращает "Привет world" в "Привет мир".
+"""
+from typing import List, Union
+
+PatchOp = Union[int, str]
+
+
+def apply_patch(text: str, ops: List[PatchOp]) -> str:
+    if not isinstance(ops, list):
+        raise ValueError("Patch must be a list of operations")
+
+    result = []
+    position = 0
+    for op in ops:
+        if isinstance(op, bool):
+            raise ValueError(f"Invalid patch operation: {op!r}")
+        if isinstance(op, str):
+            result.append(op)
+        elif isinstance(op, int) and op > 0:
+            if position + op > len(text):
+                raise ValueError("Patch retains past the end of the text")
+            result.append(text[position:position + op])
+            position += op
+        elif isinstance(op, int) and op < 0:
+            if position - op > len(text):
+                raise ValueError("Patch deletes past the end of the text")
+            position -= op
+        else:
+            raise ValueError(f"Invalid patch operation: {op!r}")
+
+    result.append(text[position:])
+    return "".join(result)
+
+
+def make_patch(old: str, new: str) -> List[PatchOp]:
+    """Патч old -> new из общего префикса и суффикса: линейно по длине и компактно для локальных правок"""
+    start = 0
+    limit = min(len(old), len(new))
+    while start < limit and old[start] == new[start]:
+        start += 1
+
+    old_end, new_end = len(old), len(new)
+    while old_end > start and new_end > start and old[old_end - 1] == new[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+
+    ops: List[PatchOp] = []
+    if start:
+        ops.append(start)
+    if old_end > start:
+        ops.append(start - old_end)
+    if new_end > start:
+        ops.append(new[start:new_end])
+    return ops
@@ -0,0 +1,267 @@
+import base64
+import json
+from collections import defaultdict
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.defs.dashboard.compression import decode_content, note_content
+from app.models.database import Folder, Note
+
+
+def build_folder_item(folder: Folder, with_children: bool = True) -> Dict[str, Any]:
+    item = {
+        "id": str(folder.id),
+        "title": folder.title,
+        "type": "folder",
+        "created_at": folder.created_at.isoformat() if folder.created_at else None,
+        "updated_at": folder.updated_at.isoformat() if folder.updated_at else None
+    }
+    if with_children:
+        item["children"] = []
+    return item
+
+
+def build_note_item(note: Note, with_content: bool = True) -> Dict[str, Any]:
+    item = {
+        "id": str(note.id),
+        "title": note.title,
+        "type": "note",
+        "created_at": note.created_at.isoformat() if note.created_at else None,
+        "updated_at": note.updated_at.isoformat() if note.updated_at else None
+    }
+    if with_content:
+        item["content"] = note_content(note)
+    return item
+
+
+def build_tree(folders: Iterable[Folder], notes: Iterable[Note], skeleton: bool = False) -> List[Dict[str, Any]]:
+    """
+    Собирает дерево папок и заметок за O(F + N).
+
+    Сначала строится индекс parent_id -> дочерние папки и folder_id -> заметки,
+    затем дерево обходится явным стеком, поэтому глубина вложенности
+    не упирается в лимит рекурсии. Папки, недостижимые из корня
+    (в том числе зацикленные), в результат не попадают.
+
+    В режиме skeleton у заметок нет content, а у папок есть children_count.
+    """
+    folders_by_parent: Dict[Optional[UUID], List[Folder]] = defaultdict(list)
+    for folder in folders:
+        folders_by_parent[folder.parent_id].append(folder)
+
+    notes_by_folder: Dict[Optional[UUID], List[Note]] = defaultdict(list)
+    for note in notes:
+        notes_by_folder[note.folder_id].append(note)
+
+    def folder_item(folder: Folder) -> Dict[str, Any]:
+        item = build_folder_item(folder)
+        if skeleton:
+            item["children_count"] = len(folders_by_parent.get(folder.id, [])) + len(notes_by_folder.get(folder.id, []))
+        return item
+
+    def note_items(folder_id: Optional[UUID]) -> List[Dict[str, Any]]:
+        return [build_note_item(note, with_content=not skeleton) for note in notes_by_folder.get(folder_id, [])]
+
+    tree: List[Dict[str, Any]] = []
+    visited = set()
+    stack = []
+
+    for folder in folders_by_parent.get(None, []):
+        item = folder_item(folder)
+        tree.append(item)
+        stack.append((folder.id, item))
+    tree.extend(note_items(None))
+
+    while stack:
+        folder_id, item = stack.pop()
+        if folder_id in visited:
+            continue
+        visited.add(folder_id)
+
+        children = item["children"]
+        for child in folders_by_parent.get(folder_id, []):
+            if child.id in visited:
+                continue
+            child_item = folder_item(child)
+            children.append(child_item)
+            stack.append((child.id, child_item))
+        children.extend(note_items(folder_id))
+
+    return tree
+
+
+def _iso(column: str) -> str:
+    """Время в UTC в формате datetime.isoformat(), как у build_tree (дробная часть только если она есть)"""
+    return (
+        f"regexp_replace(to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.US'), '\\.0{{6}}$', '')"
+        " || '+00:00'"
+    )
+
+
+def _tree_json_sql(skeleton: bool) -> str:
+    """
+    Postgres обходит иерархию в порядке DFS (сортировка по пути) и сам сериализует
+    каждую папку и список её заметок в JSON. Последняя строка (depth = 0) - корневые заметки.
+
+    Сжатые тексты Postgres распаковать не может: у таких заметок content = null,
+    а сами сжатые тексты приходят отдельной колонкой packed и подставляются в splice_tree_json.
+    """
+    folder_extra = ""
+    note_extra = ""
+    packed = "NULL"
+    if skeleton:
+        folder_extra = """,
+            'children_count',
+                (SELECT count(*) FROM folders c WHERE c.parent_id = f.id)
+                + (SELECT count(*) FROM notes c WHERE c.folder_id = f.id)"""
+    else:
+        note_extra = """,
+                'content', CASE WHEN n.content_codec IS NULL THEN n.content END"""
+        packed = """(
+            SELECT json_agg(json_build_object(
+                'id', n.id,
+                'codec', n.content_codec,
+                'data', encode(n.content_compressed, 'base64')
+            ))
+            FROM notes n
+            WHERE {notes_filter} AND n.content_codec IS NOT NULL
+        )::text"""
+
+    note_object = f"""json_build_object(
+                'id', n.id,
+                'title', n.title,
+                'type', 'note',
+                'created_at', {_iso("n.created_at")},
+                'updated_at', {_iso("n.updated_at")}{note_extra}
+            )"""
+
+    return f"""
+WITH RECURSIVE walk AS (
+    SELECT f.id, ARRAY[f.id] AS path, 1 AS depth
+    FROM folders f
+    WHERE f.user_id = :user_id AND f.parent_id IS NULL
+    UNION ALL
+    SELECT f.id, w.path || f.id, w.depth + 1
+    FROM folders f
+    JOIN walk w ON f.parent_id = w.id
+    WHERE f.user_id = :user_id AND NOT f.id = ANY(w.path)
+)
+SELECT depth, node, notes, packed FROM (
+    SELECT
+        w.path,
+        w.depth,
+        json_build_object(
+            'id', f.id,
+            'title', f.title,
+            'type', 'folder',
+            'created_at', {_iso("f.created_at")},
+            'updated_at', {_iso("f.updated_at")}{folder_extra}
+        )::text AS node,
+        COALESCE((
+            SELECT json_agg({note_object})
+            FROM notes n
+            WHERE n.folder_id = f.id
+        ), '[]')::text AS notes,
+        {packed.format(notes_filter="n.folder_id = f.id")} AS packed
+    FROM walk w
+    JOIN folders f ON f.id = w.id
+    UNION ALL
+    SELECT
+        NULL,
+        0,
+        NULL,
+        COALESCE(json_agg({note_object}), '[]')::text,
+        {packed.format(notes_filter="n.user_id = :user_id AND n.folder_id IS NULL")}
+    FROM notes n
+    WHERE n.user_id = :user_id AND n.folder_id IS NULL
+) rows
+ORDER BY path NULLS LAST
+"""
+
+
+TREE_JSON_QUERY = text(_tree_json_sql(skeleton=False))
+
+TREE_SKELETON_JSON_QUERY = text(_tree_json_sql(skeleton=True))
+
+
+def fill_packed_content(notes_json: str, packed_json: str) -> str:
+    """Подставляет распакованные тексты сжатых заметок в JSON-массив заметок папки"""
+    contents = {
+        item["id"]: decode_content(None, item["codec"], base64.b64decode(item["data"]))
+        for item in json.loads(packed_json)
+    }
+    notes = json.loads(notes_json)
+    for note in notes:
+        if note["id"] in contents:
+            note["content"] = contents[note["id"]]
+    return json.dumps(notes, ensure_ascii=False)
+
+
+async def stream_tree_json(db: AsyncSession, user_id: int, skeleton: bool = False) -> AsyncIterator[bytes]:
+    """
+    Отдаёт дерево в виде готового JSON, собранного в Postgres одним запросом.
+
+    ORM-объекты не создаются: строки приходят через серверный курсор
+    уже сериализованными, а здесь только расставляются скобки вложенности.
+    Формат совпадает с build_tree.
+    """
+    query = TREE_SKELETON_JSON_QUERY if skeleton else TREE_JSON_QUERY
+    result = await db.stream(query, {"user_id": user_id})
+
+    async for chunk in splice_tree_json(result):
+        yield chunk
+
+
+async def splice_tree_json(rows: AsyncIterable[Tuple[int, Optional[str], str, Optional[str]]]) -> AsyncIterator[bytes]:
+    """
+    Склеивает строки (depth, node, notes, packed) из TREE_JSON_QUERY в один JSON-массив.
+
+    Папки идут в порядке обхода в глубину, node - JSON папки без children,
+    notes - JSON-массив её заметок, packed - сжатые тексты заметок папки или NULL,
+    последняя строка с depth = 0 - корневые заметки.
+    Заметки папки дописываются в children после всех вложенных папок, когда папка закрывается.
+    """
+    # Для каждой открытой папки храним JSON её заметок и признак "ещё нет детей"
+    open_notes: List[str] = []
+    is_first: List[bool] = [True]
+
+    def append_items(items_json: str) -> str:
+        if items_json == "[]":
+            return ""
+        prefix = "" if is_first[-1] else ","
+        is_first[-1] = False
+        return prefix + items_json[1:-1]
+
+    def close_folder() -> str:
+        chunk = append_items(open_notes.pop()) + "]}"
+        is_first.pop()
+        return chunk
+
+    yield b"["
+    async for depth, node, notes, packed in rows:
+        if packed:
+            notes = fill_packed_content(notes, packed)
+
+        chunk = ""
+        if depth == 0:
+            while open_notes:
+                chunk += close_folder()
+            chunk += append_items(notes)
+        else:
+            while len(open_notes) >= depth:
+                chunk += close_folder()
+            if not is_first[-1]:
+                chunk += ","
+            is_first[-1] = False
+            chunk += node[:-1] + ',"children":['
+            open_notes.append(notes)
+            is_first.append(True)
+        yield chunk.encode()
+
+    chunk = ""
+    while open_notes:
+        chunk += close_folder()
+    yield (chunk + "]").encode()
@@ -0,0 +1,129 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+from app.config import settings
+
+
+class TreeCacheBackend(ABC):
+    """
+    Хранилище сериализованных деревьев.
+    Запись хранит ревизию дерева, поэтому устаревшая запись никогда не отдаётся,
+    даже если инвалидация до этого воркера не дошла.
+    """
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Tuple[int, bytes]]:
+        """(ревизия, payload) или None"""
+
+    @abstractmethod
+    def set(self, key: Hashable, revision: int, payload: bytes) -> None:
+        """Сохраняет payload дерева ревизии revision"""
+
+    @abstractmethod
+    def delete(self, key: Hashable) -> None:
+        """Удаляет запись, если она есть"""
+
+    @abstractmethod
+    def payload_limit(self) -> int:
+        """Наибольший payload, который хранилище примет; 0 - хранилище выключено"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, float]:
+        """Показатели хранилища для /metrics"""
+
+
+class MemoryTreeCacheBackend(TreeCacheBackend):
+    """LRU в памяти процесса с ограничением по числу записей, объёму и TTL"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, bytes]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Tuple[int, bytes]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, revision, payload = entry
+        if expires_at < time.monotonic():
+            self.delete(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return revision, payload
+
+    def set(self, key: Hashable, revision: int, payload: bytes) -> None:
+        if self.max_entries <= 0 or len(payload) > self.max_bytes:
+            return
+
+        self.delete(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, revision, payload)
+        self.size_bytes += len(payload)
+
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[2])
+
+    def payload_limit(self) -> int:
+        return self.max_bytes if self.max_entries > 0 else 0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "evictions": self.evictions
+        }
+
+
+class TreeCache:
+    def __init__(self, backend: TreeCacheBackend) -> None:
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, skeleton: bool, revision: int) -> Optional[bytes]:
+        entry = self.backend.get((user_id, skeleton))
+        if entry is None or entry[0] != revision:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry[1]
+
+    def set(self, user_id: int, skeleton: bool, revision: int, payload: bytes) -> None:
+        self.backend.set((user_id, skeleton), revision, payload)
+
+    def payload_limit(self) -> int:
+        return self.backend.payload_limit()
+
+    def invalidate(self, user_id: int) -> None:
+        self.backend.delete((user_id, False))
+        self.backend.delete((user_id, True))
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            **self.backend.stats()
+        }
+
+
+tree_cache = TreeCache(MemoryTreeCacheBackend(
+    max_entries=settings.TREE_CACHE_MAX_ENTRIES,
+    max_bytes=settings.TREE_CACHE_MAX_BYTES,
+    ttl_seconds=settings.TREE_CACHE_TTL_SECONDS
+))
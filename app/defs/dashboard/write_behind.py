@@ -0,0 +1,165 @@
+"""
+Отложенная запись автосохранений заметок (write-behind).
+
+При NOTE_WRITE_BEHIND_SECONDS > 0 изменения текста и заголовка заметки не пишутся
+в notes сразу: последнее состояние держится в памяти и записывается одним UPDATE
+не позже чем через интервал после первой правки. Ревизия дерева резервируется при первой
+правке, поэтому клиент сразу получает ревизию и версию, с которыми заметка будет записана.
+
+Перед чтением заметок пользователя и перед другими изменениями его заметок отложенные
+записи сбрасываются, при остановке приложения сбрасываются все. Буфер живёт в памяти
+процесса: включать его стоит при одном воркере или при привязке пользователей к воркерам.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+from uuid import UUID
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+
+
+class PendingNoteWrite:
+    def __init__(self, user, note_id: UUID, title: str, content: str, version: int, revision: int) -> None:
+        self.user = user
+        self.note_id = note_id
+        self.title = title
+        self.content = content
+        # Версия в БД, от которой считаются отложенные правки, и версия после них
+        self.base_version = version
+        self.version = version
+        self.revision = revision
+        # Какие поля меняли правки: только их можно переносить поверх изменённой строки
+        self.title_changed = False
+        self.content_changed = False
+        self.due = time.monotonic() + settings.NOTE_WRITE_BEHIND_SECONDS
+
+
+class WriteBehindBuffer:
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.coalesced = 0
+        self.writes = 0
+        self.failures = 0
+        self._pending: Dict[UUID, PendingNoteWrite] = {}
+        self._by_user: Dict[int, Set[UUID]] = defaultdict(set)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._lock_users: Dict[int, int] = defaultdict(int)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    @asynccontextmanager
+    async def lock(self, user_id: int) -> AsyncIterator[None]:
+        """
+        Отложенные правки и запись заметок одного пользователя выполняются строго по очереди.
+        Блокировка удаляется, когда её никто не держит и не ждёт.
+        """
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        self._lock_users[user_id] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[user_id] -= 1
+            if not self._lock_users[user_id]:
+                del self._lock_users[user_id]
+                del self._locks[user_id]
+
+    def get(self, note_id: UUID) -> Optional[PendingNoteWrite]:
+        return self._pending.get(note_id)
+
+    def put(self, pending: PendingNoteWrite) -> None:
+        self._pending[pending.note_id] = pending
+        self._by_user[pending.user.id].add(pending.note_id)
+
+    async def discard(self, user_id: int, note_id) -> None:
+        """Забывает правки удаляемой заметки; запись, которая уже идёт, сначала завершается"""
+        async with self.lock(user_id):
+            pending = self._pending.pop(UUID(str(note_id)), None)
+            if pending:
+                self._forget(pending)
+
+    def _forget(self, pending: PendingNoteWrite) -> None:
+        notes = self._by_user.get(pending.user.id)
+        if notes is not None:
+            notes.discard(pending.note_id)
+            if not notes:
+                del self._by_user[pending.user.id]
+
+    async def flush_note(self, note_id) -> None:
+        note_id = UUID(str(note_id))
+        pending = self._pending.get(note_id)
+        if pending is None:
+            return
+
+        async with self.lock(pending.user.id):
+            pending = self._pending.get(note_id)
+            if pending is None:
+                return
+
+            # При ошибке БД правки остаются в буфере до следующей попытки
+            if await self._write(pending):
+                self._pending.pop(note_id, None)
+                self._forget(pending)
+
+    async def flush_user(self, user_id: int) -> None:
+        for note_id in list(self._by_user.get(user_id, ())):
+            await self.flush_note(note_id)
+
+    async def flush_due(self) -> None:
+        now = time.monotonic()
+        for note_id in [note_id for note_id, pending in self._pending.items() if pending.due <= now]:
+            await self.flush_note(note_id)
+
+    async def flush_all(self) -> None:
+        for note_id in list(self._pending):
+            await self.flush_note(note_id)
+
+    async def _write(self, pending: PendingNoteWrite) -> bool:
+        from app.defs.dashboard.defs import Dashboard
+
+        try:
+            async with AsyncSessionLocal() as session:
+                await Dashboard(session).write_pending_note(pending)
+        except Exception as e:
+            print(str(e))
+            self.failures += 1
+            return False
+
+        self.writes += 1
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval / 2)
+            try:
+                await self.flush_due()
+            except Exception as e:
+                # Фоновая задача не должна завершаться: иначе правки перестанут записываться
+                print(str(e))
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush_all()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "coalesced": self.coalesced,
+            "writes": self.writes,
+            "failures": self.failures
+        }
+
+
+write_behind = WriteBehindBuffer(settings.NOTE_WRITE_BEHIND_SECONDS)
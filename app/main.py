@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import Cookie, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, RedirectResponse
@@ -6,16 +8,30 @@ from fastapi import status
 from app.routers.auth import router as auth_router
 from app.routers.profile import router as profile_router
 from app.routers import dashboard
-from app.defs.auth.jwt_handler import decode_jwt
+from app.defs.auth.jwt_handler import decode_jwt, token_cache
+from app.defs.auth.password_pool import password_pool
+from app.defs.auth.principal_cache import principal_cache
 from app.config import settings
+from app.defs.dashboard.compression import compression_stats
+from app.defs.dashboard.tree_cache import tree_cache
+from app.defs.dashboard.write_behind import write_behind
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    write_behind.start()
+    yield
+    # Отложенные правки заметок записываются до остановки процесса
+    await write_behind.stop()
+    password_pool.shutdown()
+
 app = FastAPI(
     title="Brain Notes",
     description="Приложение для удобного структурированного хранения заметок",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -39,7 +55,8 @@ async def custom_http_exception_handler(request: Request, exc: StarletteHTTPExce
         return templates.TemplateResponse("index.html", {"request": request}, status_code=401)
     # if exc.status_code == status.HTTP_403_FORBIDDEN:
     #     return templates.TemplateResponse("403.html", {"request": request}, status_code=403)
-    return HTMLResponse(str(exc.detail), status_code=exc.status_code)
+    # Заголовки исключения (ETag у 409, Retry-After у 503) нужны клиенту
+    return HTMLResponse(str(exc.detail), status_code=exc.status_code, headers=getattr(exc, "headers", None))
 
 @app.get("/")
 async def root(request: Request, access_token: str = Cookie(None)):
@@ -57,4 +74,16 @@ async def root(request: Request, access_token: str = Cookie(None)):
     
 @app.get("/status")
 async def status_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@app.get("/metrics")
+async def metrics():
+    """Счётчики кэшей и сжатия этого процесса"""
+    return {
+        "tree_cache": tree_cache.stats(),
+        "jwt_cache": token_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "password_hashing": password_pool.stats(),
+        "note_compression": compression_stats.as_dict(),
+        "write_behind": write_behind.stats()
+    }
\ No newline at end of file
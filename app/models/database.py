@@ -1,9 +1,37 @@
 import uuid
-from sqlalchemy import UUID, Column, Integer, String, Boolean, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from typing import Optional
+from sqlalchemy import DDL, UUID, Column, Computed, Index, Integer, LargeBinary, String, Text, Boolean, DateTime, ForeignKey, TypeDecorator, UniqueConstraint, cast, event, literal_column
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
+from app.config import settings
 from app.database import Base
 
+# Конфигурация полнотекстового поиска; должна совпадать в колонке и в запросах
+SEARCH_CONFIG = "russian"
+
+
+def search_text(content: Optional[str]) -> Optional[str]:
+    """Начало текста, которое индексируется для поиска: не больше NOTE_SEARCH_MAX_BYTES байт UTF-8"""
+    if content is None:
+        return None
+    return content.encode()[:settings.NOTE_SEARCH_MAX_BYTES].decode(errors="ignore")
+
+
+class TextSearchVector(TypeDecorator):
+    """tsvector, который записывается из обычного текста: to_tsvector считает сам Postgres"""
+    impl = TSVECTOR
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return search_text(value)
+
+    def bind_expression(self, bindvalue):
+        return func.to_tsvector(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), cast(bindvalue, Text))
+
+# Триграммные индексы по заголовкам требуют расширения pg_trgm
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 
 class User(Base):
     __tablename__ = "users"
@@ -16,6 +44,11 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_verified = Column(Boolean, default=False)
 
+    # Счётчик ревизий дерева: растёт на каждом изменении папок и заметок
+    tree_revision = Column(Integer, nullable=False, default=0, server_default="0")
+    # Эпоха безопасности: увеличение отзывает выданные токены (смена пароля, деактивация)
+    security_epoch = Column(Integer, nullable=False, default=0, server_default="0")
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -33,6 +66,11 @@ class User(Base):
 
 class Folder(Base):
     __tablename__ = "folders"
+    __table_args__ = (
+        Index("ix_folders_user_id_revision", "user_id", "revision"),
+        Index("ix_folders_path", "path", postgresql_ops={"path": "text_pattern_ops"}),
+        Index("ix_folders_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     title = Column(String(50))
@@ -40,6 +78,12 @@ class Folder(Base):
     parent_id = Column(UUID(as_uuid=True), ForeignKey("folders.id", ondelete="CASCADE"), nullable=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
 
+    # Материализованный путь "/<id корня>/.../<id папки>/", см. app/defs/dashboard/folder_paths.py
+    path = Column(Text, nullable=True)
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
+    # Версия для оптимистичной блокировки (If-Match/ETag), растёт на каждом изменении
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -64,16 +108,103 @@ class Folder(Base):
 
 class Note(Base):
     __tablename__ = "notes"
+    __table_args__ = (
+        Index("ix_notes_user_id_revision", "user_id", "revision"),
+        Index("ix_notes_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_notes_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     title = Column(String(50))
     content = Column(String, nullable=False)
+    # Большие тексты хранятся сжатыми, в content тогда только начало, см. app/defs/dashboard/compression.py
+    content_codec = Column(String(10), nullable=True)
+    content_compressed = Column(LargeBinary, nullable=True)
 
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     folder_id = Column(UUID(as_uuid=True), ForeignKey("folders.id", ondelete="CASCADE"), nullable=True, index=True)
 
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
+    # Версия для оптимистичной блокировки (If-Match/ETag), растёт на каждом изменении
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # Лексемы полного текста (в том числе сжатого): пишутся вместе с текстом через encode_content()
+    content_vector = deferred(Column(TextSearchVector, nullable=True))
+    # Поисковый вектор считает сам Postgres: заголовок весит больше текста
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+            "setweight(coalesce(content_vector, ''::tsvector), 'B')",
+            persisted=True
+        )
+    ))
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     user = relationship("User", back_populates="notes")
     folder = relationship("Folder", back_populates="notes")
+
+
+# Ключ сортировки списка заметок: у ещё не редактированных заметок updated_at пустой
+note_sort_key = func.coalesce(Note.updated_at, Note.created_at)
+
+Index("ix_notes_user_id_sort_key_id", Note.user_id, note_sort_key, Note.id)
+Index("ix_notes_folder_id_sort_key_id", Note.folder_id, note_sort_key, Note.id)
+
+
+class NoteRevision(Base):
+    """
+    Прошлая версия заметки. Раз в несколько версий хранится полный текст (snapshot),
+    между ними - обратный патч (diff), превращающий следующую сохранённую версию в эту.
+    """
+    __tablename__ = "note_revisions"
+    __table_args__ = (
+        UniqueConstraint("note_id", "version", name="uq_note_revisions_note_id_version"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    note_id = Column(UUID(as_uuid=True), ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    version = Column(Integer, nullable=False)
+    kind = Column(String(10), nullable=False)
+    title = Column(String(50))
+    data = Column(Text, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class TreeTombstone(Base):
+    """Запись об удалённой папке или заметке для инкрементальной синхронизации дерева"""
+    __tablename__ = "tree_tombstones"
+    __table_args__ = (
+        Index("ix_tree_tombstones_user_id_revision", "user_id", "revision"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    item_id = Column(UUID(as_uuid=True), nullable=False)
+    item_type = Column(String(10), nullable=False)
+    revision = Column(Integer, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+
+class NoteLink(Base):
+    """
+    Ссылка из текста заметки: @<id заметки> или #<id папки>, см. app/defs/dashboard/links.py.
+    Пересчитывается только для сохраняемой заметки, обратные ссылки ищутся по индексу цели.
+    """
+    __tablename__ = "note_links"
+    __table_args__ = (
+        UniqueConstraint("source_id", "target_type", "target_id", name="uq_note_links_source_target"),
+        Index("ix_note_links_user_id_target", "user_id", "target_type", "target_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    source_id = Column(UUID(as_uuid=True), ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    target_type = Column(String(10), nullable=False)
+    target_id = Column(UUID(as_uuid=True), nullable=False)
@@ -1,6 +1,6 @@
 from fastapi import HTTPException, status
 from pydantic import BaseModel, EmailStr, Field, ValidationError
-from typing import Optional
+from typing import List, Literal, Optional, Union
 from datetime import datetime
 
 from uuid import UUID
@@ -55,12 +55,25 @@ class NewNoteCreate(BaseModel):
 
 class NoteUpdate(BaseModel):
     title: Optional[str] = Field(None, max_length=50)
-    content: Optional[str] = FileExistsError(None)
+    content: Optional[str] = Field(None)
+    patch: Optional[List[Union[int, str]]] = Field(None, description="Правки относительно base_revision")
+    base_revision: Optional[int] = Field(None)
     folder_id: Optional[UUID] = Field(None)
 
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "move", "delete"]
+    type: Literal["note", "folder"]
+    id: Optional[UUID] = Field(None, description="Для create - необязательный id, на который можно сослаться в других операциях")
+    title: Optional[str] = Field(None, max_length=50)
+    content: Optional[str] = Field(None)
+    folder_id: Optional[UUID] = Field(None)
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=1000)
+
 async def validate_data(data, validation_class):
     try:
-        validation_class(**data)
+        return validation_class(**data)
     except ValidationError as e:
         print(e.errors())
         miss = [i['loc'][-1] for i in e.errors()]
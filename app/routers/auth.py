@@ -6,15 +6,16 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy import exists
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from passlib.context import CryptContext
-from datetime import timedelta
 
 from app.database import get_db
 from app.config import settings
 from app.defs.auth.dependencies import get_current_active_user
+from app.defs.auth.principal_cache import principal_cache
+from app.defs.auth.token_claims import epoch_is_current, has_claims, revoke_tokens, security_epochs, set_access_cookie, set_refresh_cookie
 from app.models.validators import ResendVerificationRequest
 from app.models.database import User
-from app.defs.auth.jwt_handler import create_access_token, create_refresh_token, decode_jwt
+from app.defs.auth.jwt_handler import decode_jwt
+from app.defs.auth.passwords import hash_password, needs_rehash, rehash_password, verify_password
 from app.defs.auth.email_utils import verify_email_token, generate_password_reset_token, verify_password_reset_token
 from app.defs.auth.service_defs import send_password_reset_email, send_verification_email, send_welcome_email
 
@@ -23,8 +24,6 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 templates = Jinja2Templates(directory="templates/auth")
 error_templates = Jinja2Templates(directory="templates")
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-
 @router.get("/register")
 async def register_get(request: Request):
     return templates.TemplateResponse("register.html", {"request": request})
@@ -55,7 +54,7 @@ async def register(
         username=username,
         email=email,
         full_name=full_name,
-        hashed_password=pwd_context.hash(password),
+        hashed_password=await hash_password(password),
         is_verified=False
     )
 
@@ -109,6 +108,7 @@ async def verify_email(
     # Подтверждаем email
     user.is_verified = True
     await db.commit()
+    principal_cache.invalidate(user.id)
 
     background_tasks.add_task(
         send_welcome_email,
@@ -131,12 +131,18 @@ async def change_email_verify(token: str, request: Request, user: User = Depends
     
     user.email = email
     await db.commit()
+    principal_cache.invalidate(user.id)
 
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
             "email-change-success.html",
             {"request": request},
             status_code=status.HTTP_200_OK
         )
+    if settings.ACCESS_TOKEN_CLAIMS:
+        # Новый email должен попасть в токен этой сессии
+        set_access_cookie(response, user)
+
+    return response
 
 @router.get("/me")
 async def get_current_user(
@@ -170,6 +176,22 @@ async def get_current_user(
             detail="Invalid token"
         )
 
+    if has_claims(payload):
+        # Всё нужное уже в токене, остаётся сверить эпоху
+        if not await epoch_is_current(db, payload):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token"
+            )
+
+        return {
+            "username": payload.get("username"),
+            "email": payload.get("email"),
+            "full_name": payload.get("full_name"),
+            "is_verified": payload.get("is_verified"),
+            "created_at": payload.get("created_at")
+        }
+
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
 
@@ -230,6 +252,7 @@ async def login(request: Request):
 @router.post("/login")
 async def login(
     response: Response,
+    background_tasks: BackgroundTasks,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
 ):
@@ -240,7 +263,7 @@ async def login(
     result = await db.execute(select(User).where(User.username == form_data.username))
     user = result.scalar_one_or_none()
 
-    if not user or not pwd_context.verify(form_data.password, user.hashed_password):
+    if not user or not await verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Неверные учетные данные"
@@ -252,32 +275,13 @@ async def login(
             detail="Email не подтверждён"
         )
 
-    # Создаем токены
-    access_token = create_access_token(
-        data={"sub": str(user.id)},
-        expires_delta=timedelta(minutes=30)
-    )
-    refresh_token = create_refresh_token(
-        data={"sub": str(user.id)}
-    )
+    # Хеш со старыми параметрами argon2 пересчитываем после ответа, пока известен пароль
+    if needs_rehash(user.hashed_password):
+        background_tasks.add_task(rehash_password, user.id, form_data.password, user.hashed_password)
 
-    response.set_cookie(
-        key="access_token",
-        value=access_token,
-        httponly=True,      # Защита от XSS
-        secure=False,        # Только HTTPS (в продакшене)
-        samesite="lax",     # Защита от CSRF
-        max_age=1800        # 30 минут
-    )
-
-    response.set_cookie(
-        key="refresh_token",
-        value=refresh_token,
-        httponly=True,
-        secure=False,
-        samesite="lax",
-        max_age=2592000     # 30 дней
-    )
+    # Создаем токены: HTTP-only cookies (защита от XSS), samesite=lax (защита от CSRF)
+    set_access_cookie(response, user)
+    set_refresh_cookie(response, user)
 
     return {
         "message": "Login successful",
@@ -314,20 +318,22 @@ async def refresh_token(
             detail="Invalid refresh token"
         )
 
-    # Создаем новый access token
-    new_access_token = create_access_token(
-        data={"sub": str(user_id)},
-        expires_delta=timedelta(minutes=30)
-    )
+    if settings.ACCESS_TOKEN_CLAIMS:
+        # В новый access-токен попадают актуальные флаги, поэтому пользователя читаем из БД
+        user = (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
 
-    response.set_cookie(
-        key="access_token",
-        value=new_access_token,
-        httponly=True,
-        secure=False,
-        samesite="lax",
-        max_age=1800
-    )
+        # Токен, выданный до появления эпох, считается токеном нулевой эпохи: после
+        # revoke_tokens он перестаёт действовать так же, как и новые
+        if not user or not user.is_active or payload.get("epoch", 0) != user.security_epoch:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid refresh token"
+            )
+    else:
+        user = User(id=user_id)
+
+    # Создаем новый access token
+    set_access_cookie(response, user)
 
     return {"message": "Token refreshed"}
 
@@ -394,7 +400,10 @@ async def reset_password(
             detail="User not found"
         )
     
-    user.hashed_password = pwd_context.hash(new_password)
+    user.hashed_password = await hash_password(new_password)
+    revoke_tokens(user)
     await db.commit()
+    principal_cache.invalidate(user.id)
+    security_epochs.invalidate(user.id)
 
     return {"message": "Password successfully reset"}
@@ -1,15 +1,23 @@
+import shutil
+import tempfile
+from typing import Literal, Optional
+from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi import APIRouter, Body, Cookie, Depends, HTTPException, Request, status
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Body, Cookie, Depends, File, Header, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
+from app.config import settings
 from app.defs.auth.jwt_handler import decode_jwt
 from app.database import get_db
 from app.defs.dashboard.defs import Dashboard
-from app.models.database import User
-from app.models.validators import NewFolderCreate, NewFolderUpdate, NewNoteCreate, NoteUpdate, validate_data
-from app.defs.auth.dependencies import get_current_active_user, get_current_user
+from app.defs.dashboard.etag import make_etag, parse_if_match
+from app.defs.dashboard.streaming import iter_json_array, iter_json_lines
+from app.models.validators import BatchRequest, NewFolderCreate, NewFolderUpdate, NewNoteCreate, NoteUpdate, validate_data
+from app.defs.auth.dependencies import get_current_active_principal, get_current_principal
+from app.defs.auth.principal_cache import Principal
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 templates = Jinja2Templates(directory="templates/dashboard")
@@ -43,7 +51,7 @@ async def dashboard(
         return RedirectResponse(url="/auth/login")
     
 @router.put("/note")
-async def note_create(data: dict, request: Request, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def note_create(data: dict, request: Request, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
 
     await validate_data(data, NewNoteCreate)
 
@@ -57,44 +65,213 @@ async def note_create(data: dict, request: Request, user: User = Depends(get_cur
     return note
 
 @router.post("/tree")
-async def get_tree(request: Request, user: User = Depends(get_current_active_user), db: AsyncSession = Depends(get_db)):
-    """Получить древовидную структуру заметок и папок"""
+async def get_tree(request: Request, skeleton: bool = False, format: Literal["json", "ndjson"] = "json", user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """
+    Получить древовидную структуру заметок и папок.
+    С skeleton=true заметки отдаются без content, его можно получить через GET /dashboard/note/{note_id}.
+    Заголовок X-Tree-Revision содержит ревизию, от которой можно запрашивать /dashboard/changes.
+    С format=ndjson узлы отдаются плоским потоком строк с parent_id/folder_id.
+    """
     try:
         dashboard = Dashboard(db)
 
-        res = await dashboard.get_tree(user)
+        # Ревизию читаем до дерева: изменения между чтениями придут повторно в /changes
+        revision = await dashboard.get_revision(user)
+        revision_headers = {"X-Tree-Revision": str(revision)}
+
+        if format == "ndjson":
+            return StreamingResponse(
+                iter_json_lines(dashboard.iter_tree_nodes(user, skeleton=skeleton)),
+                media_type="application/x-ndjson",
+                headers=revision_headers
+            )
 
-        return res
+        if settings.TREE_ENGINE == "postgres":
+            return StreamingResponse(
+                dashboard.stream_tree(user, skeleton=skeleton, revision=revision),
+                media_type="application/json",
+                headers=revision_headers
+            )
+
+        payload = await dashboard.get_tree_json(user, skeleton=skeleton, revision=revision)
+
+        return Response(content=payload, media_type="application/json", headers=revision_headers)
     except Exception as e:
         print(str(e))
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal server error")
 
 
+@router.get("/changes")
+async def get_changes(request: Request, since: int = 0, user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """Изменения дерева после ревизии since, включая удалённые элементы"""
+    dashboard = Dashboard(db)
+
+    res = await dashboard.get_changes(user, since)
+
+    return res
+
+
 @router.post("/notes")
-async def get_all_notes(request: Request, user: User = Depends(get_current_active_user), db: AsyncSession = Depends(get_db)):
-    await db.refresh(user, ["notes"])
+async def get_all_notes(
+    request: Request,
+    format: Literal["json", "ndjson", "json-stream"] = "json",
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    order: Literal["desc", "asc"] = "desc",
+    folder_id: Optional[UUID] = None,
+    user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Заметки пользователя страницами по (updated_at, id): {"items": [...], "next_cursor": ...}.
+    Следующая страница запрашивается с cursor=next_cursor.
+    format=ndjson и format=json-stream отдают все заметки сразу, читая их серверным курсором.
+    """
+    if format == "ndjson":
+        return StreamingResponse(iter_json_lines(Dashboard(db).iter_notes(user)), media_type="application/x-ndjson")
+    if format == "json-stream":
+        return StreamingResponse(iter_json_array(Dashboard(db).iter_notes(user)), media_type="application/json")
+
+    dashboard = Dashboard(db)
+
+    res = await dashboard.list_notes(user, limit=limit, cursor=cursor, order=order, folder_id=folder_id)
+
+    return res
+
+@router.get("/export")
+async def export_notes(request: Request, user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """Все папки и заметки одним ZIP-архивом с Markdown-файлами, отдаётся потоком"""
+    return StreamingResponse(
+        Dashboard(db).export_zip(user),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="notes.zip"'}
+    )
+
+@router.post("/import")
+async def import_notes(request: Request, file: UploadFile = File(...), folder_id: Optional[UUID] = Query(None), user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """
+    Импорт ZIP-архива с Markdown-файлами: каталоги становятся папками, файлы - заметками.
+    Ответ - NDJSON с прогрессом после каждой записанной партии.
+    """
+    # Загрузку копируем во временный файл: импорт читает её уже после того, как FastAPI закроет UploadFile
+    archive = tempfile.TemporaryFile()
+    await run_in_threadpool(shutil.copyfileobj, file.file, archive)
+
+    progress = await Dashboard(db).import_archive(user, archive, folder_id)
+
+    return StreamingResponse(iter_json_lines(progress), media_type="application/x-ndjson")
+
+@router.get("/search")
+async def search_notes(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Полнотекстовый поиск по заметкам с ранжированием и подсветкой совпадений"""
+    dashboard = Dashboard(db)
+
+    res = await dashboard.search_notes(user, q, limit=limit, cursor=cursor)
 
-    return user.notes
+    return res
+
+@router.get("/autocomplete")
+async def autocomplete(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=50),
+    user: Principal = Depends(get_current_active_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Быстрый переход к заметке или папке по части заголовка"""
+    dashboard = Dashboard(db)
+
+    res = await dashboard.autocomplete(user, q, limit=limit)
+
+    return res
+
+@router.get("/note/{note_id}")
+async def get_note(request: Request, response: Response, note_id: UUID, user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    dashboard = Dashboard(db)
+
+    res = await dashboard.get_note(user, note_id)
+    response.headers["ETag"] = make_etag(res["version"])
+
+    return res
 
 @router.patch("/note/{note_id}")
-async def update_note(request: Request, note_id, data = Body(), user: User = Depends(get_current_active_user), db: AsyncSession = Depends(get_db)):
+async def update_note(request: Request, response: Response, note_id, data = Body(), if_match: Optional[str] = Header(None), user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """С заголовком If-Match обновление выполняется, только если версия заметки не изменилась, иначе 409"""
     dashboard = Dashboard(db)
     await validate_data(data, NoteUpdate)
 
-    res = await dashboard.update_note(user, note_id, **data)
+    res = await dashboard.update_note(user, note_id, expected_version=parse_if_match(if_match), **data)
+    response.headers["ETag"] = make_etag(res["version"])
+
+    return res
+
+@router.get("/note/{note_id}/revisions")
+async def list_note_revisions(request: Request, note_id: UUID, user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """Сохранённые прошлые версии заметки, от новых к старым"""
+    dashboard = Dashboard(db)
+
+    res = await dashboard.list_note_revisions(user, note_id)
+
+    return res
+
+@router.get("/note/{note_id}/revisions/{version}")
+async def get_note_revision(request: Request, note_id: UUID, version: int, user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    dashboard = Dashboard(db)
+
+    res = await dashboard.get_note_revision(user, note_id, version)
+
+    return res
+
+@router.post("/note/{note_id}/revisions/{version}/restore")
+async def restore_note_revision(request: Request, response: Response, note_id: UUID, version: int, user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """Восстановить заметку из прошлой версии; текущий текст при этом тоже попадает в историю"""
+    dashboard = Dashboard(db)
+
+    revision = await dashboard.get_note_revision(user, note_id, version)
+    res = await dashboard.update_note(user, note_id, title=revision["title"], content=revision["content"])
+    response.headers["ETag"] = make_etag(res["version"])
+
+    return res
+
+@router.get("/note/{note_id}/backlinks")
+async def get_note_backlinks(request: Request, note_id: UUID, user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """Заметки, в тексте которых есть ссылка @<note_id>"""
+    dashboard = Dashboard(db)
+
+    res = await dashboard.get_backlinks(user, note_id)
 
     return res
 
 @router.delete("/note/{note_id}")
-async def delete_note(request: Request, note_id, user: User = Depends(get_current_active_user), db: AsyncSession = Depends(get_db)):
+async def delete_note(request: Request, note_id, user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
     dashboard = Dashboard(db)
     
     res = await dashboard.delete_note(user, note_id)
 
     return res
 
+@router.post("/batch")
+async def batch(request: Request, data = Body(), user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """
+    Набор операций create/update/move/delete одной транзакцией:
+    {"operations": [{"op": "move", "type": "note", "id": ..., "folder_id": ...}, ...]}
+    """
+    batch_request = await validate_data(data, BatchRequest)
+    dashboard = Dashboard(db)
+
+    res = await dashboard.batch(user, [operation.model_dump() for operation in batch_request.operations])
+
+    return res
+
 @router.put("/folder")
-async def new_folder(data: dict, request: Request, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def new_folder(data: dict, request: Request, user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
     await validate_data(data, NewFolderCreate)
 
     dashboard = Dashboard(db_conn=db)
@@ -104,15 +281,52 @@ async def new_folder(data: dict, request: Request, user: User = Depends(get_curr
     return note
 
 @router.patch("/folder/{source_id}")
-async def update_folder(request: Request, source_id, data = Body(), user: User = Depends(get_current_active_user), db: AsyncSession = Depends(get_db)):
+async def update_folder(request: Request, response: Response, source_id, data = Body(), if_match: Optional[str] = Header(None), user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """С заголовком If-Match обновление выполняется, только если версия папки не изменилась, иначе 409"""
     await validate_data(data, NewFolderUpdate)
     dashboard = Dashboard(db_conn=db)
-    note = await dashboard.update_folder(source_id, user, **data)
+    note = await dashboard.update_folder(source_id, user, expected_version=parse_if_match(if_match), **data)
+    response.headers["ETag"] = make_etag(note["version"])
 
     return note
 
+@router.get("/subtree")
+async def get_root_subtree(request: Request, depth: int = Query(1, ge=1, le=32), user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """Корневые папки и заметки на depth уровней вниз, для ленивого раскрытия дерева"""
+    dashboard = Dashboard(db)
+
+    res = await dashboard.get_subtree(user, depth=depth)
+
+    return res
+
+@router.get("/folder/{folder_id}/subtree")
+async def get_folder_subtree(request: Request, folder_id: UUID, depth: int = Query(1, ge=1, le=32), user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """Содержимое папки на depth уровней вниз"""
+    dashboard = Dashboard(db)
+
+    res = await dashboard.get_subtree(user, folder_id, depth=depth)
+
+    return res
+
+@router.get("/folder/{folder_id}/path")
+async def get_folder_path(request: Request, folder_id: UUID, user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    dashboard = Dashboard(db)
+
+    res = await dashboard.get_folder_path(user, folder_id)
+
+    return res
+
+@router.get("/folder/{folder_id}/backlinks")
+async def get_folder_backlinks(request: Request, folder_id: UUID, user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
+    """Заметки, в тексте которых есть ссылка #<folder_id>"""
+    dashboard = Dashboard(db)
+
+    res = await dashboard.get_folder_backlinks(user, folder_id)
+
+    return res
+
 @router.delete("/folder/{folder_id}")
-async def delete_note(request: Request, folder_id, user: User = Depends(get_current_active_user), db: AsyncSession = Depends(get_db)):
+async def delete_note(request: Request, folder_id, user: Principal = Depends(get_current_active_principal), db: AsyncSession = Depends(get_db)):
     dashboard = Dashboard(db)
     
     res = await dashboard.delete_folder(folder_id, user)
@@ -1,32 +1,32 @@
 from sqlalchemy import exists, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi import APIRouter, BackgroundTasks, Body, Cookie, Depends, HTTPException, Request, status
+from fastapi import APIRouter, BackgroundTasks, Body, Cookie, Depends, HTTPException, Request, Response, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
-from passlib.context import CryptContext
-
+from app.config import settings
 from app.database import get_db
 from app.defs.auth.service_defs import send_change_mail_email
 from app.models.database import User
 from app.models.validators import validate_data
-from app.defs.auth.dependencies import get_current_active_user
+from app.defs.auth.passwords import hash_password, verify_password
+from app.defs.auth.dependencies import get_current_active_principal, get_current_active_user
+from app.defs.auth.principal_cache import Principal, principal_cache
+from app.defs.auth.token_claims import revoke_tokens, security_epochs, set_access_cookie, set_refresh_cookie
 
 router = APIRouter(prefix="/profile", tags=["Profile"])
 templates = Jinja2Templates(directory="templates/profile")
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-
 @router.get("", response_class=HTMLResponse)
-async def open_profile(request: Request, user: User = Depends(get_current_active_user)):
+async def open_profile(request: Request, user: Principal = Depends(get_current_active_principal)):
     return templates.TemplateResponse(
             "profile.html",
             {"request": request}
         )
 
 @router.post("/update")
-async def update_profile(background_tasks: BackgroundTasks, request: Request, data = Body(), db: AsyncSession = Depends(get_db), user: User = Depends(get_current_active_user)):
+async def update_profile(background_tasks: BackgroundTasks, request: Request, response: Response, data = Body(), db: AsyncSession = Depends(get_db), user: User = Depends(get_current_active_user)):
     full_name = data.get("full_name")
     old_password = data.get("old_password")
     new_password = data.get("new_password")
@@ -52,17 +52,24 @@ async def update_profile(background_tasks: BackgroundTasks, request: Request, da
         }
 
     if new_password:
-        if not  old_password or not pwd_context.verify(old_password, user.hashed_password):
+        if not  old_password or not await verify_password(old_password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверные учетные данные"
             )
         
-        new_password = pwd_context.hash(new_password)
+        new_password = await hash_password(new_password)
 
         user.hashed_password = new_password
+        # Смена пароля отзывает токены всех сессий, текущей выдаём новые
+        revoke_tokens(user)
 
         await db.commit()
+        principal_cache.invalidate(user.id)
+        security_epochs.invalidate(user.id)
+        if settings.ACCESS_TOKEN_CLAIMS:
+            set_access_cookie(response, user)
+            set_refresh_cookie(response, user)
 
         return {
             "message": "Password successfully changed"
@@ -72,6 +79,9 @@ async def update_profile(background_tasks: BackgroundTasks, request: Request, da
         user.full_name = full_name
 
         await db.commit()
+        principal_cache.invalidate(user.id)
+        if settings.ACCESS_TOKEN_CLAIMS:
+            set_access_cookie(response, user)
 
         return {
             "message": "Full name successfully changed"
@@ -0,0 +1,6 @@
+"""
+Замеры производительности на синтетических данных, без БД.
+
+Запуск из корня репозитория, например:
+    python -m benchmarks.tree_build --folders 50000 --notes 200000
+"""
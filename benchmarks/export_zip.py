@@ -0,0 +1,85 @@
+"""
+Экспорт в ZIP: скорость записи и пиковая память write_vault_zip.
+
+Строки папок и заметок берутся из make_rows и подаются в том порядке, в каком их
+отдают запросы iter_vault_zip; готовые куски архива только подсчитываются, поэтому
+пик памяти (tracemalloc, отдельным прогоном - трассировка сильно замедляет запись)
+показывает, сколько держит сам экспорт. От объёма текстов он не зависит, а с числом
+заметок растёт только на оглавление архива (несколько сотен байт на файл), которое
+zipfile копит до конца и отдаёт последним куском.
+
+    python -m benchmarks.export_zip --folders 5000 --notes 100000 --note-size 4096
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from app.defs.dashboard.export import write_vault_zip
+from benchmarks.tree_build import make_rows
+
+
+async def iter_rows(rows: List[Any]) -> AsyncIterator[Any]:
+    for row in rows:
+        yield row
+
+
+def vault_rows(folder_count: int, note_count: int, seed: int = 0, note_size: int = 0) -> Tuple[List[Any], List[Any]]:
+    """
+    Папки в порядке создания (родитель всегда раньше), заметки сгруппированы по папкам, корень в конце.
+    С note_size текст каждой заметки дополняется до note_size символов.
+    """
+    folders, notes = make_rows(folder_count, note_count, seed)
+    filler = "Lorem ipsum dolor sit amet, съешь же ещё этих мягких французских булок. "
+    for note in notes:
+        if len(note.content) < note_size:
+            note.content = (note.content + " " + filler * (note_size // len(filler) + 1))[:note_size]
+    notes.sort(key=lambda note: (note.folder_id is None, str(note.folder_id)))
+    return folders, notes
+
+
+async def export_size(folders: List[Any], notes: List[Any]) -> Tuple[int, int]:
+    """Размер архива и размер последнего куска (в нём оглавление архива)"""
+    size = last = 0
+    async for chunk in write_vault_zip(iter_rows(folders), iter_rows(notes)):
+        size += len(chunk)
+        last = len(chunk)
+    return size, last
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Скорость и память потокового экспорта в ZIP")
+    parser.add_argument("--folders", type=int, default=5000)
+    parser.add_argument("--notes", type=int, default=100000)
+    parser.add_argument("--note-size", type=int, default=4096, help="длина текста заметки в символах")
+    parser.add_argument("--steps", type=int, default=3, help="сколько объёмов замерить, каждый в 4 раза меньше следующего")
+    args = parser.parse_args(argv)
+
+    print(
+        f"{'folders':>8} {'notes':>8} {'text, MiB':>10} {'seconds':>8} {'notes/s':>9} "
+        f"{'zip, MiB':>9} {'last chunk, KiB':>16} {'peak, MiB':>10}"
+    )
+    for step in reversed(range(args.steps)):
+        folder_count = max(1, args.folders // 4 ** step)
+        note_count = args.notes // 4 ** step
+        folders, notes = vault_rows(folder_count, note_count, note_size=args.note_size)
+        text = sum(len(note.content.encode()) for note in notes)
+
+        started = time.perf_counter()
+        size, last = asyncio.run(export_size(folders, notes))
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        asyncio.run(export_size(folders, notes))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"{folder_count:>8} {note_count:>8} {text / 1024 / 1024:>10.1f} {elapsed:>8.2f} {note_count / elapsed:>9.0f} "
+            f"{size / 1024 / 1024:>9.1f} {last / 1024:>16.1f} {peak / 1024 / 1024:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Сборка дерева: build_tree против прежнего рекурсивного сборщика.
+
+Прежний сборщик для каждой папки перебирал все папки в поисках детей (O(F²)),
+поэтому на больших объёмах он запускается только до --legacy-limit папок.
+
+    python -m benchmarks.tree_build --folders 50000 --notes 200000
+"""
+import argparse
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.defs.dashboard.tree import build_tree
+
+STAMP = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_rows(folder_count: int, note_count: int, seed: int = 0) -> Tuple[List[Any], List[Any]]:
+    """
+    Папки и заметки с теми же атрибутами, что у ORM-объектов.
+    Родитель папки выбирается среди уже созданных (около 5% папок - корневые),
+    заметка попадает в случайную папку или в корень.
+    """
+    rng = random.Random(seed)
+
+    folders = []
+    for index in range(folder_count):
+        parent = folders[rng.randrange(index)].id if index and rng.random() > 0.05 else None
+        folders.append(SimpleNamespace(
+            id=uuid.UUID(int=rng.getrandbits(128)),
+            parent_id=parent,
+            title=f"Folder {index}",
+            created_at=STAMP,
+            updated_at=None
+        ))
+
+    notes = []
+    for index in range(note_count):
+        folder = folders[rng.randrange(folder_count)].id if folders and rng.random() > 0.1 else None
+        notes.append(SimpleNamespace(
+            id=uuid.UUID(int=rng.getrandbits(128)),
+            folder_id=folder,
+            title=f"Note {index}",
+            content=f"Text of note {index}",
+            content_codec=None,
+            content_compressed=None,
+            created_at=STAMP,
+            updated_at=STAMP
+        ))
+
+    return folders, notes
+
+
+def legacy_build_tree(folders: List[Any], notes: List[Any]) -> List[Dict[str, Any]]:
+    """Сборщик дерева до перехода на build_tree (Dashboard.get_tree), без изменений в алгоритме"""
+    all_folders = list(folders)
+    # Вместо selectinload(Folder.notes)
+    folder_notes = defaultdict(list)
+    for note in notes:
+        folder_notes[note.folder_id].append(note)
+    root_notes = folder_notes.get(None, [])
+
+    folders_by_id = {folder.id: folder for folder in all_folders}
+
+    def build_folder_tree(folder_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+        folder = folders_by_id.get(folder_id)
+        if not folder:
+            return None
+
+        children_folders = [
+            f for f in all_folders
+            if f.parent_id == folder_id
+        ]
+
+        children_notes = folder_notes.get(folder.id, [])
+
+        return {
+            "id": str(folder.id),
+            "title": folder.title,
+            "type": "folder",
+            "created_at": folder.created_at.isoformat() if folder.created_at else None,
+            "updated_at": folder.updated_at.isoformat() if folder.updated_at else None,
+            "children": [
+                *[build_folder_tree(child.id) for child in children_folders],
+                *[build_note_item(note) for note in children_notes]
+            ]
+        }
+
+    def build_note_item(note: Any) -> Dict[str, Any]:
+        return {
+            "id": str(note.id),
+            "title": note.title,
+            "content": note.content,
+            "type": "note",
+            "created_at": note.created_at.isoformat() if note.created_at else None,
+            "updated_at": note.updated_at.isoformat() if note.updated_at else None
+        }
+
+    root_folders = [f for f in all_folders if f.parent_id is None]
+
+    return [
+        *[build_folder_tree(folder.id) for folder in root_folders],
+        *[build_note_item(note) for note in root_notes]
+    ]
+
+
+def best_of(repeat: int, function, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Время сборки дерева в зависимости от объёма")
+    parser.add_argument("--folders", type=int, default=50000)
+    parser.add_argument("--notes", type=int, default=200000)
+    parser.add_argument("--steps", type=int, default=4, help="сколько объёмов замерить, каждый в 4 раза меньше следующего")
+    parser.add_argument("--legacy-limit", type=int, default=5000, help="до скольких папок замерять прежний сборщик")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'folders':>8} {'notes':>8} {'build_tree, ms':>15} {'skeleton, ms':>13} {'legacy, ms':>11}")
+    for step in reversed(range(args.steps)):
+        folder_count = max(1, args.folders // 4 ** step)
+        note_count = args.notes // 4 ** step
+        folders, notes = make_rows(folder_count, note_count)
+
+        full = best_of(args.repeat, build_tree, folders, notes)
+        skeleton = best_of(args.repeat, lambda: build_tree(folders, notes, skeleton=True))
+        legacy = "-"
+        if folder_count <= args.legacy_limit:
+            legacy = f"{best_of(args.repeat, legacy_build_tree, folders, notes) * 1000:.1f}"
+
+        print(f"{folder_count:>8} {note_count:>8} {full * 1000:>15.1f} {skeleton * 1000:>13.1f} {legacy:>11}")
+
+
+if __name__ == "__main__":
+    main()
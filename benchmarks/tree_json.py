@@ -0,0 +1,126 @@
+"""
+JSON дерева от запроса до байтов ответа: TREE_ENGINE=python против TREE_ENGINE=postgres.
+
+Нужна настоящая база из DATABASE_URL со схемой приложения. Скрипт создаёт временного
+пользователя с --folders папками и --notes заметками, замеряет оба движка теми же
+методами Dashboard, что вызывает POST /dashboard/tree, и удаляет пользователя:
+
+- python: два запроса (папки и заметки), загрузка ORM-объектов, build_tree и json.dumps
+  (Dashboard.get_tree_json);
+- postgres: один рекурсивный запрос TREE_JSON_QUERY и склейка готовых кусков JSON
+  (Dashboard.stream_tree), тело читается до конца.
+
+Кэш дерева на время замера выключен, логирование SQL (echo) тоже.
+
+    python -m benchmarks.tree_json --folders 50000 --notes 200000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert
+
+from app.database import AsyncSessionLocal, engine, insert_rows
+from app.defs.dashboard.compression import encode_content
+from app.defs.dashboard.defs import Dashboard
+from app.defs.dashboard.folder_paths import folder_path
+from app.defs.dashboard.tree_cache import MemoryTreeCacheBackend, tree_cache
+from app.models.database import Folder, Note, User
+from benchmarks.tree_build import make_rows
+
+
+async def seed(folder_count: int, note_count: int) -> int:
+    """Временный пользователь с деревом из make_rows; возвращает его id"""
+    folders, notes = make_rows(folder_count, note_count)
+    name = f"bench-{uuid.uuid4().hex[:12]}"
+
+    paths: Dict[Any, str] = {}
+    folder_rows: List[Dict[str, Any]] = []
+    # make_rows создаёт родителя раньше вложенных папок
+    for row in folders:
+        paths[row.id] = folder_path(paths.get(row.parent_id), row.id)
+        folder_rows.append({"id": row.id, "title": row.title, "parent_id": row.parent_id, "path": paths[row.id]})
+
+    async with AsyncSessionLocal() as session:
+        user_id = (await session.execute(
+            insert(User)
+            .values(username=name, email=f"{name}@example.com", full_name=name, hashed_password="-")
+            .returning(User.id)
+        )).scalar_one()
+
+        await insert_rows(session, Folder, [{**row, "user_id": user_id} for row in folder_rows])
+        await insert_rows(session, Note, [
+            {**encode_content(row.content), "id": row.id, "title": row.title, "user_id": user_id, "folder_id": row.folder_id}
+            for row in notes
+        ])
+        await session.commit()
+
+    return user_id
+
+
+async def drop(user_id: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(User).where(User.id == user_id))
+        await session.commit()
+
+
+async def python_engine(user: User, skeleton: bool) -> int:
+    async with AsyncSessionLocal() as session:
+        return len(await Dashboard(session).get_tree_json(user, skeleton=skeleton))
+
+
+async def postgres_engine(user: User, skeleton: bool) -> int:
+    async with AsyncSessionLocal() as session:
+        size = 0
+        async for chunk in Dashboard(session).stream_tree(user, skeleton=skeleton):
+            size += len(chunk)
+        return size
+
+
+async def measure(user_id: int, repeat: int, skeleton: bool) -> Tuple[Tuple[float, int], Tuple[float, int]]:
+    """(лучшее время, размер JSON) для python и для postgres"""
+    user = User(id=user_id)
+    results = []
+    for run in (python_engine, postgres_engine):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            size = await run(user, skeleton)
+            timings.append(time.perf_counter() - started)
+        results.append((min(timings), size))
+    return results[0], results[1]
+
+
+async def run(args: argparse.Namespace) -> None:
+    engine.sync_engine.echo = False
+    tree_cache.backend = MemoryTreeCacheBackend(max_entries=0, max_bytes=0, ttl_seconds=0)
+
+    started = time.perf_counter()
+    user_id = await seed(args.folders, args.notes)
+    print(f"seeded {args.folders} folders, {args.notes} notes in {time.perf_counter() - started:.1f} s")
+
+    try:
+        (python_time, python_size), (postgres_time, postgres_size) = await measure(user_id, args.repeat, args.skeleton)
+    finally:
+        if not args.keep:
+            await drop(user_id)
+        await engine.dispose()
+
+    print(f"python:   {python_time * 1000:.1f} ms, {python_size / 1024 / 1024:.1f} MiB")
+    print(f"postgres: {postgres_time * 1000:.1f} ms, {postgres_size / 1024 / 1024:.1f} MiB")
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Оба движка JSON дерева на настоящей базе, от запроса до байтов ответа")
+    parser.add_argument("--folders", type=int, default=50000)
+    parser.add_argument("--notes", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skeleton", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="не удалять временного пользователя")
+    asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
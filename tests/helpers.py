@@ -0,0 +1,159 @@
+"""
+Общие для тестов строки и эталоны: заменители ORM-строк папок и заметок, прежний
+сборщик дерева, строки TREE_JSON_QUERY и случайные правки текста.
+
+Тесты не импортируют друг друга и скрипты из benchmarks/, поэтому всё общее лежит здесь.
+"""
+import base64
+import json
+import random
+import uuid
+import zlib
+from collections import defaultdict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Collection, Dict, Iterable, List, Optional, Tuple
+
+from app.defs.dashboard.compression import CODEC_ZLIB
+from app.defs.dashboard.tree import splice_tree_json
+
+STAMP = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+TreeRow = Tuple[int, Optional[str], str, Optional[str]]
+
+
+def folder(folder_id, parent_id=None, title="Folder"):
+    return SimpleNamespace(id=folder_id, parent_id=parent_id, title=title, created_at=STAMP, updated_at=None)
+
+
+def note(folder_id=None, title="Note", content="text"):
+    return SimpleNamespace(
+        id=uuid.uuid4(), folder_id=folder_id, title=title, content=content,
+        content_codec=None, content_compressed=None, created_at=STAMP, updated_at=STAMP
+    )
+
+
+def make_rows(folder_count: int, note_count: int, seed: int = 0) -> Tuple[List[Any], List[Any]]:
+    """
+    Случайное дерево: родитель папки выбирается среди уже созданных (около 5% папок -
+    корневые), заметка попадает в случайную папку или в корень.
+    """
+    rng = random.Random(seed)
+
+    folders = []
+    for index in range(folder_count):
+        parent = folders[rng.randrange(index)].id if index and rng.random() > 0.05 else None
+        folders.append(folder(uuid.UUID(int=rng.getrandbits(128)), parent, f"Folder {index}"))
+
+    notes = []
+    for index in range(note_count):
+        folder_id = folders[rng.randrange(folder_count)].id if folders and rng.random() > 0.1 else None
+        row = note(folder_id, f"Note {index}", f"Text of note {index}")
+        row.id = uuid.UUID(int=rng.getrandbits(128))
+        notes.append(row)
+
+    return folders, notes
+
+
+def vault_rows(folder_count: int, note_count: int, seed: int = 0) -> Tuple[List[Any], List[Any]]:
+    """Строки в порядке запросов экспорта: папки - родитель раньше вложенных, заметки - по папкам"""
+    folders, notes = make_rows(folder_count, note_count, seed)
+    notes.sort(key=lambda row: (row.folder_id is None, str(row.folder_id)))
+    return folders, notes
+
+
+def legacy_build_tree(folders: List[Any], notes: List[Any]) -> List[Dict[str, Any]]:
+    """Эталон: сборщик дерева до перехода на build_tree (Dashboard.get_tree), без изменений в алгоритме"""
+    all_folders = list(folders)
+    folder_notes = defaultdict(list)
+    for row in notes:
+        folder_notes[row.folder_id].append(row)
+    root_notes = folder_notes.get(None, [])
+
+    folders_by_id = {row.id: row for row in all_folders}
+
+    def build_folder_tree(folder_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+        item = folders_by_id.get(folder_id)
+        if not item:
+            return None
+
+        children_folders = [f for f in all_folders if f.parent_id == folder_id]
+        children_notes = folder_notes.get(item.id, [])
+
+        return {
+            "id": str(item.id),
+            "title": item.title,
+            "type": "folder",
+            "created_at": item.created_at.isoformat() if item.created_at else None,
+            "updated_at": item.updated_at.isoformat() if item.updated_at else None,
+            "children": [
+                *[build_folder_tree(child.id) for child in children_folders],
+                *[build_note_item(child) for child in children_notes]
+            ]
+        }
+
+    def build_note_item(item: Any) -> Dict[str, Any]:
+        return {
+            "id": str(item.id),
+            "title": item.title,
+            "content": item.content,
+            "type": "note",
+            "created_at": item.created_at.isoformat() if item.created_at else None,
+            "updated_at": item.updated_at.isoformat() if item.updated_at else None
+        }
+
+    root_folders = [f for f in all_folders if f.parent_id is None]
+
+    return [
+        *[build_folder_tree(item.id) for item in root_folders],
+        *[build_note_item(item) for item in root_notes]
+    ]
+
+
+def _notes_json(notes: List[Dict[str, Any]], packed_ids: Collection[str]) -> Tuple[str, Optional[str]]:
+    """JSON заметок и колонка packed: тексты заметок из packed_ids уходят сжатыми, как у сжатых заметок в БД"""
+    packed = [
+        {"id": item["id"], "codec": CODEC_ZLIB, "data": base64.b64encode(zlib.compress(item["content"].encode())).decode()}
+        for item in notes if item["id"] in packed_ids
+    ]
+    notes = [{**item, "content": None} if item["id"] in packed_ids else item for item in notes]
+    return json.dumps(notes, ensure_ascii=False), json.dumps(packed) if packed else None
+
+
+def tree_rows(tree: List[Dict[str, Any]], packed_ids: Collection[str] = ()) -> List[TreeRow]:
+    """Строки (depth, node, notes, packed) в порядке TREE_JSON_QUERY для дерева в формате build_tree"""
+    rows = []
+    stack = [(item, 1) for item in reversed(tree) if item["type"] == "folder"]
+    while stack:
+        item, depth = stack.pop()
+        node = {key: value for key, value in item.items() if key != "children"}
+        folders = [child for child in item["children"] if child["type"] == "folder"]
+        notes = [child for child in item["children"] if child["type"] == "note"]
+        rows.append((depth, json.dumps(node, ensure_ascii=False), *_notes_json(notes, packed_ids)))
+        stack.extend((child, depth + 1) for child in reversed(folders))
+
+    root_notes = [item for item in tree if item["type"] == "note"]
+    rows.append((0, None, *_notes_json(root_notes, packed_ids)))
+    return rows
+
+
+async def iter_rows(rows: Iterable[Any]) -> AsyncIterator[Any]:
+    for row in rows:
+        yield row
+
+
+async def splice(rows: List[TreeRow]) -> bytes:
+    return b"".join([chunk async for chunk in splice_tree_json(iter_rows(rows))])
+
+
+ALPHABET = "ab \nяж😀𝄞́"
+
+
+def random_text(rng, length):
+    return "".join(rng.choice(ALPHABET) for _ in range(length))
+
+
+def random_edit(rng, text):
+    start = rng.randint(0, len(text))
+    end = rng.randint(start, min(len(text), start + 5))
+    return text[:start] + random_text(rng, rng.randint(0, 5)) + text[end:]
@@ -0,0 +1,35 @@
+"""
+Сжатие больших текстов заметок и текст для поискового индекса
+"""
+from types import SimpleNamespace
+
+from app.config import settings
+from app.defs.dashboard.compression import CODEC_ZLIB, encode_content, note_content
+from app.models.database import search_text
+
+
+def test_small_text_is_stored_plain():
+    values = encode_content("short")
+
+    assert values == {"content": "short", "content_codec": None, "content_compressed": None, "content_vector": "short"}
+
+
+def test_large_text_is_compressed_and_fully_indexed(monkeypatch):
+    monkeypatch.setattr(settings, "NOTE_COMPRESS_THRESHOLD", 1024)
+    content = "начало " + "повтор " * 1000 + "последнееслово"
+
+    values = encode_content(content)
+
+    assert values["content_codec"] == CODEC_ZLIB
+    assert len(values["content"]) == settings.NOTE_COMPRESSED_PREVIEW_CHARS
+    assert values["content_vector"] == content
+    assert note_content(SimpleNamespace(**values)) == content
+
+
+def test_search_text_is_capped_on_character_boundary(monkeypatch):
+    monkeypatch.setattr(settings, "NOTE_SEARCH_MAX_BYTES", 5)
+
+    # "я" занимает 2 байта: третья буква целиком не помещается и отбрасывается
+    assert search_text("яяяя") == "яя"
+    assert search_text("abc") == "abc"
+    assert search_text(None) is None
@@ -0,0 +1,89 @@
+"""
+Версии и ETag: заголовок If-Match и ответ 409 с текущей версией
+"""
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.defs.auth.dependencies import get_current_active_principal
+from app.defs.auth.principal_cache import Principal
+from app.defs.dashboard.etag import make_etag, parse_if_match
+from app.main import app
+
+
+@pytest.mark.parametrize("header, version", [
+    (None, None),
+    ("*", None),
+    (" * ", None),
+    ('"3"', 3),
+    (" \"42\" ", 42),
+    ("7", 7),
+    (make_etag(12), 12),
+])
+def test_parse_if_match(header, version):
+    assert parse_if_match(header) == version
+
+
+@pytest.mark.parametrize("header", ['W/"3"', ' W/"3"', '"abc"', '"1", "2"', "", '""'])
+def test_parse_if_match_rejects_weak_and_malformed_tags(header):
+    with pytest.raises(HTTPException) as error:
+        parse_if_match(header)
+
+    assert error.value.status_code == 400
+
+
+class FakeSession:
+    """Сессия, которая отдаёт заранее заданные результаты запросов по порядку"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.commits = 0
+
+    async def execute(self, *args, **kwargs):
+        value = self.results.pop(0)
+        return SimpleNamespace(scalar_one=lambda: value, scalar_one_or_none=lambda: value)
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_active_principal] = lambda: Principal(1, True, True, "user")
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_conflict_carries_current_etag(client):
+    # Ревизия дерева, условный UPDATE не нашёл строку с ожидаемой версией, текущая версия
+    session = FakeSession(5, None, 7)
+    app.dependency_overrides[get_db] = lambda: session
+
+    response = client.patch(
+        f"/dashboard/note/{uuid.uuid4()}",
+        json={"folder_id": None},
+        headers={"If-Match": '"3"'}
+    )
+
+    assert response.status_code == 409
+    assert response.headers["ETag"] == '"7"'
+    assert session.commits == 0
+
+
+def test_update_returns_new_etag(client):
+    session = FakeSession(5, 4)
+    app.dependency_overrides[get_db] = lambda: session
+
+    response = client.patch(
+        f"/dashboard/note/{uuid.uuid4()}",
+        json={"folder_id": None},
+        headers={"If-Match": '"3"'}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"4"'
+    assert response.json()["revision"] == 5
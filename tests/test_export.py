@@ -0,0 +1,87 @@
+"""
+Потоковый экспорт в ZIP (write_vault_zip) без базы: строки подаются из списков
+"""
+import asyncio
+import io
+import uuid
+import zipfile
+
+from app.config import settings
+from app.defs.dashboard import export
+from app.defs.dashboard.compression import CODEC_ZLIB, encode_content
+from tests.helpers import folder, iter_rows, note, vault_rows
+
+
+def archive(folders, notes):
+    async def collect():
+        return [chunk async for chunk in export.write_vault_zip(iter_rows(folders), iter_rows(notes))]
+
+    chunks = asyncio.run(collect())
+    return chunks, zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
+def test_archive_opens_with_deduplicated_names():
+    root = folder(uuid.uuid4(), title="Проекты")
+    twin = folder(uuid.uuid4(), title="проекты")
+    child = folder(uuid.uuid4(), root.id, title="a/b:c")
+    orphan = folder(uuid.uuid4(), uuid.uuid4(), title="Проекты")
+    notes = [
+        note(root.id, "План", "один"),
+        note(root.id, "план", "два"),
+        note(root.id, "План (2)", "три"),
+        note(child.id, "", "четыре"),
+        note(None, "Заметка 😀", "пять"),
+        note(uuid.uuid4(), "Заметка 😀", "шесть"),
+    ]
+
+    _, zip_file = archive([root, twin, child, orphan], notes)
+
+    assert zip_file.testzip() is None
+    assert zip_file.namelist() == [
+        "Проекты/",
+        "проекты (2)/",
+        "Проекты/a_b_c/",
+        "Проекты (3)/",
+        "Проекты/План.md",
+        "Проекты/план (2).md",
+        "Проекты/План (2) (2).md",
+        "Проекты/a_b_c/Untitled.md",
+        "Заметка 😀.md",
+        "Заметка 😀 (2).md",
+    ]
+    assert zip_file.read("Проекты/план (2).md").decode() == "два"
+    assert zip_file.read("Заметка 😀 (2).md").decode() == "шесть"
+
+
+def test_compressed_notes_are_unpacked(monkeypatch):
+    monkeypatch.setattr(settings, "NOTE_COMPRESS_THRESHOLD", 1024)
+    text = "Большая заметка 😀 " * 1000
+    packed = note()
+    for key, value in encode_content(text).items():
+        setattr(packed, key, value)
+
+    assert packed.content_codec == CODEC_ZLIB
+    # В content остаётся только начало текста - экспорт должен взять полный из content_compressed
+    assert len(packed.content) < len(text)
+    assert len(packed.content_compressed) < len(text.encode())
+
+    _, zip_file = archive([], [packed])
+
+    assert zip_file.read("Note.md").decode() == text
+
+
+def test_output_is_streamed_in_chunks(monkeypatch):
+    monkeypatch.setattr(export, "STREAM_CHUNK_SIZE", 4096)
+    folders, notes = vault_rows(50, 2000, seed=4)
+
+    chunks, zip_file = archive(folders, notes)
+
+    assert len(chunks) > 10
+    assert zip_file.testzip() is None
+    assert len(zip_file.namelist()) == 2050
+
+
+def test_empty_vault():
+    _, zip_file = archive([], [])
+
+    assert zip_file.namelist() == []
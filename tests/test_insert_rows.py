@@ -0,0 +1,73 @@
+"""
+Многострочные INSERT (insert_rows): запросы собираются диалектом asyncpg без подключения к базе
+"""
+import asyncio
+import uuid
+
+from sqlalchemy.dialects.postgresql import asyncpg
+
+import app.database
+from app.database import insert_rows
+from app.defs.dashboard.compression import encode_content
+from app.models.database import Note, NoteLink
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement, *args):
+        # Вторым аргументом передавались бы параметры executemany
+        assert not args
+        self.statements.append(statement.compile(dialect=asyncpg.dialect()))
+
+
+def link_rows(count):
+    return [
+        {"source_id": uuid.uuid4(), "user_id": 1, "target_type": "note", "target_id": uuid.uuid4()}
+        for _ in range(count)
+    ]
+
+
+def test_rows_go_in_one_multi_row_statement():
+    session = RecordingSession()
+
+    asyncio.run(insert_rows(session, NoteLink, link_rows(10)))
+
+    assert len(session.statements) == 1
+    sql = str(session.statements[0])
+    assert sql.startswith("INSERT INTO note_links")
+    assert sql.count("), (") == 9
+    assert len(session.statements[0].params) == 40
+
+
+def test_statements_stay_under_parameter_limit(monkeypatch):
+    monkeypatch.setattr(app.database, "MAX_BIND_PARAMS", 40)
+    session = RecordingSession()
+
+    asyncio.run(insert_rows(session, NoteLink, link_rows(21)))
+
+    # 40 параметров на 5 колонок note_links - по 8 строк (по 4 значения) в запросе
+    assert [len(statement.params) for statement in session.statements] == [32, 32, 20]
+
+
+def test_no_rows_no_statements():
+    session = RecordingSession()
+
+    asyncio.run(insert_rows(session, NoteLink, []))
+
+    assert session.statements == []
+
+
+def test_notes_keep_search_vector_expression():
+    session = RecordingSession()
+    rows = [
+        {**encode_content(f"text {index}"), "id": uuid.uuid4(), "title": "t", "user_id": 1, "folder_id": None, "revision": 1}
+        for index in range(3)
+    ]
+
+    asyncio.run(insert_rows(session, Note, rows))
+
+    sql = str(session.statements[0])
+    assert sql.count("to_tsvector(") == 3
+    assert "search_vector" not in sql
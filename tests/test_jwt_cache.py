@@ -0,0 +1,80 @@
+"""
+Кэш проверенных JWT (VerifiedTokenCache) в decode_jwt
+"""
+import time
+from datetime import timedelta
+
+import jwt
+import pytest
+
+from app.config import settings
+from app.defs.auth import jwt_handler
+from app.defs.auth.jwt_handler import VerifiedTokenCache, create_access_token, decode_jwt
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = VerifiedTokenCache(100)
+    monkeypatch.setattr(jwt_handler, "token_cache", cache)
+    return cache
+
+
+def test_valid_token_is_served_from_cache(cache):
+    token = create_access_token({"sub": "1"})
+
+    first = decode_jwt(token)
+    first["sub"] = "2"
+
+    assert decode_jwt(token)["sub"] == "1"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_expired_token_is_not_served_from_cache(cache):
+    token = create_access_token({"sub": "1"}, timedelta(seconds=1))
+    expires_at = jwt.decode(token, options={"verify_signature": False})["exp"]
+
+    assert decode_jwt(token)["sub"] == "1"
+    time.sleep(max(0.0, expires_at - time.time()) + 0.05)
+
+    assert decode_jwt(token) is None
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("make_token", [
+    lambda: "not a token",
+    lambda: create_access_token({"sub": "1"}) + "x",
+    lambda: jwt.encode({"sub": "1", "exp": time.time() + 60}, "другой ключ подписи, не SECRET_KEY", algorithm=settings.ALGORITHM),
+    lambda: create_access_token({"sub": "1"}, timedelta(seconds=-10)),
+])
+def test_invalid_token_is_never_cached(cache, make_token):
+    token = make_token()
+
+    assert decode_jwt(token) is None
+    assert decode_jwt(token) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["hits"] == 0
+
+
+def test_disabled_cache_keeps_nothing(monkeypatch):
+    cache = VerifiedTokenCache(0)
+    monkeypatch.setattr(jwt_handler, "token_cache", cache)
+    token = create_access_token({"sub": "1"})
+
+    assert decode_jwt(token)["sub"] == "1"
+    assert decode_jwt(token)["sub"] == "1"
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_token_is_evicted():
+    cache = VerifiedTokenCache(2)
+    payload = {"exp": time.time() + 60}
+    cache.set(b"a", payload)
+    cache.set(b"b", payload)
+    cache.get(b"a")
+    cache.set(b"c", payload)
+
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == payload
+    assert cache.get(b"c") == payload
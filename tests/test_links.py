@@ -0,0 +1,84 @@
+"""
+Разбор ссылок между заметками (parse_links)
+"""
+import uuid
+
+import pytest
+
+from app.defs.dashboard.links import parse_links
+
+NOTE = uuid.UUID("0f8fad5b-d9cb-469f-a165-70867728950e")
+FOLDER = uuid.UUID("7c9e6679-7425-40de-944b-e07fc1f90ae7")
+
+
+def test_note_and_folder_links():
+    assert parse_links(f"См. @{NOTE} в папке #{FOLDER}.") == {("note", NOTE), ("folder", FOLDER)}
+
+
+def test_duplicates_are_collapsed():
+    assert parse_links(f"@{NOTE} @{NOTE} @{str(NOTE).upper()}") == {("note", NOTE)}
+
+
+def test_same_id_as_note_and_folder():
+    assert parse_links(f"@{NOTE} #{NOTE}") == {("note", NOTE), ("folder", NOTE)}
+
+
+def test_self_link_is_dropped():
+    text = f"Эта заметка: @{NOTE}, её папка: #{NOTE}"
+
+    assert parse_links(text, NOTE) == {("folder", NOTE)}
+    assert parse_links(text, str(NOTE)) == {("folder", NOTE)}
+    assert parse_links(text, FOLDER) == {("note", NOTE), ("folder", NOTE)}
+
+
+@pytest.mark.parametrize("text", [
+    "@0f8fad5b-d9cb-469f-a165-70867728950",
+    "@0f8fad5b-d9cb-469f-a165-70867728950e1",
+    "@0f8fad5b-d9cb-469f-a165-70867728950ex",
+    "@0f8fad5b-d9cb-469f-a165-70867728950e-1",
+    "@0f8fad5b-d9cb-469f-a165-70867728950g",
+    "@0f8fad5bd9cb469fa16570867728950e",
+    "@{0f8fad5b-d9cb-469f-a165-70867728950e}",
+    "mail@0f8fad5b-d9cb-469f-a165-70867728950e",
+    "@@0f8fad5b-d9cb-469f-a165-70867728950e",
+    "##0f8fad5b-d9cb-469f-a165-70867728950e",
+    "",
+    None,
+])
+def test_malformed_links_are_ignored(text):
+    assert parse_links(text) == set()
+
+
+@pytest.mark.parametrize("text", [
+    f"(@{NOTE})",
+    f"@{NOTE}.",
+    f"[ссылка](@{NOTE})",
+    f"строка\n@{NOTE}\n",
+])
+def test_punctuation_around_links(text):
+    assert parse_links(text) == {("note", NOTE)}
+
+
+def test_links_in_code_are_ignored():
+    text = (
+        f"`@{NOTE}` и #{FOLDER}\n"
+        "```\n"
+        f"@{FOLDER}\n"
+        "```\n"
+        "~~~python\n"
+        f"#{NOTE}\n"
+        "~~~\n"
+        f"после блока @{NOTE}\n"
+    )
+
+    assert parse_links(text) == {("folder", FOLDER), ("note", NOTE)}
+    assert parse_links(f"`@{NOTE}`") == set()
+    assert parse_links(f"```\n@{NOTE}\n```") == set()
+
+
+def test_unclosed_code_block_runs_to_the_end():
+    assert parse_links(f"#{FOLDER}\n```\n@{NOTE}\n") == {("folder", FOLDER)}
+
+
+def test_backtick_inside_line_does_not_open_block():
+    assert parse_links(f"a ``` b\n@{NOTE}") == {("note", NOTE)}
@@ -0,0 +1,36 @@
+"""
+Курсоры keyset-пагинации
+"""
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.defs.dashboard.pagination import decode_cursor, encode_cursor
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def test_round_trip():
+    cursor = encode_cursor("2024-01-01T00:00:00+00:00", "0f3c", 1.5)
+
+    assert decode_cursor(cursor, 3) == ["2024-01-01T00:00:00+00:00", "0f3c", "1.5"]
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not base64 at all!",
+    raw_cursor({"a": 1}),
+    raw_cursor(["only one"]),
+    raw_cursor([1, 2]),
+    raw_cursor([None, "x"]),
+    raw_cursor([["nested"], "x"])
+])
+def test_invalid_cursor_is_bad_request(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, 2)
+
+    assert error.value.status_code == 400
@@ -0,0 +1,101 @@
+"""
+Пул хеширования паролей: отказ при переполнении, таймаут и освобождение мест
+"""
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.defs.auth.password_pool import PasswordHashPool
+from app.main import custom_http_exception_handler
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+@pytest.fixture
+def pool():
+    pool = PasswordHashPool(workers=1, max_queue=1, timeout_seconds=5)
+    yield pool
+    pool.shutdown()
+
+
+async def until(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+def test_full_pool_rejects_and_releases_slots(pool, release):
+    async def scenario():
+        running = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+        await until(lambda: pool.in_flight == 2)
+
+        with pytest.raises(HTTPException) as error:
+            await pool.run(lambda: "unreachable")
+
+        assert error.value.status_code == 503
+        assert error.value.headers == {"Retry-After": "1"}
+        assert pool.rejected == 1
+        # Отказ не занимает место в пуле
+        assert pool.in_flight == 2
+
+        release.set()
+        assert await asyncio.gather(*running) == [True, True]
+        await until(lambda: pool.in_flight == 0)
+
+        assert await pool.run(lambda value: value * 2, 21) == 42
+
+    asyncio.run(scenario())
+
+    assert pool.stats()["completed"] == 3
+    assert pool.stats()["in_flight"] == 0
+
+
+def test_timeout_keeps_slot_until_thread_finishes(pool, release):
+    pool.timeout_seconds = 0.05
+
+    async def scenario():
+        with pytest.raises(HTTPException) as error:
+            await pool.run(release.wait)
+
+        assert error.value.status_code == 503
+        assert pool.timeouts == 1
+        # Поток ещё работает: место освободится, только когда он закончит
+        assert pool.in_flight == 1
+
+        release.set()
+        await until(lambda: pool.in_flight == 0)
+
+    asyncio.run(scenario())
+
+    assert pool.stats()["completed"] == 1
+
+
+def test_failed_hash_releases_slot(pool):
+    def fail():
+        raise ValueError("bad hash")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await pool.run(fail)
+        await until(lambda: pool.in_flight == 0)
+
+    asyncio.run(scenario())
+
+    assert pool.stats()["completed"] == 0
+    assert pool.stats()["in_flight"] == 0
+
+
+def test_busy_response_keeps_retry_after(pool):
+    request = Request({"type": "http", "method": "POST", "path": "/auth/login", "headers": []})
+
+    response = asyncio.run(custom_http_exception_handler(request, pool._busy()))
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
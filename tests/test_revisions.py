@@ -0,0 +1,108 @@
+"""
+История заметки: снимки, обратные патчи и восстановление версий
+"""
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.defs.dashboard.revisions import DIFF, SNAPSHOT, reconstruct, revision_data, revision_kind
+from tests.helpers import random_edit
+
+
+class History:
+    """
+    История одной заметки в памяти, повторяющая запросы Dashboard._save_note_revision
+    (выбор вида записи и удаление сверх NOTE_REVISION_RETENTION) и
+    Dashboard.get_note_revision (отрезок от версии до ближайшего более нового снимка).
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.version = 1
+        self.rows = []
+        self.texts = {1: content}
+
+    def save(self, new_content):
+        last_snapshot = max((row.version for row in self.rows if row.kind == SNAPSHOT), default=0)
+        diffs_since_snapshot = sum(1 for row in self.rows if row.version > last_snapshot)
+        kind = revision_kind(diffs_since_snapshot)
+
+        self.rows.append(SimpleNamespace(
+            version=self.version,
+            kind=kind,
+            data=revision_data(kind, self.content, new_content)
+        ))
+        self.rows = sorted(self.rows, key=lambda row: row.version, reverse=True)[:settings.NOTE_REVISION_RETENTION]
+
+        self.content = new_content
+        self.bump()
+
+    def bump(self):
+        """Изменение без смены текста (перенос, заголовок): версия растёт, запись в историю не пишется"""
+        self.version += 1
+        self.texts[self.version] = self.content
+
+    def chain(self, version):
+        snapshot = min(
+            (row.version for row in self.rows if row.version >= version and row.kind == SNAPSHOT),
+            default=None
+        )
+        return sorted(
+            (row for row in self.rows if row.version >= version and (snapshot is None or row.version <= snapshot)),
+            key=lambda row: row.version,
+            reverse=True
+        )
+
+    def get(self, version):
+        revisions = self.chain(version)
+        assert revisions[-1].version == version
+        return reconstruct(self.content, revisions)
+
+
+@pytest.fixture
+def history_settings(monkeypatch):
+    monkeypatch.setattr(settings, "NOTE_REVISION_SNAPSHOT_EVERY", 5)
+    monkeypatch.setattr(settings, "NOTE_REVISION_RETENTION", 23)
+
+
+def test_revision_kind_takes_snapshot_every_n(history_settings):
+    assert [revision_kind(diffs) for diffs in range(6)] == [DIFF, DIFF, DIFF, DIFF, SNAPSHOT, SNAPSHOT]
+
+
+def test_every_retained_version_is_restored(history_settings):
+    rng = random.Random(0)
+    history = History("Заметка 😀 𝄞")
+
+    for step in range(120):
+        history.save(random_edit(rng, history.content))
+        if step % 7 == 0:
+            history.bump()
+
+        for row in history.rows:
+            assert history.get(row.version) == history.texts[row.version]
+            assert len(history.chain(row.version)) <= settings.NOTE_REVISION_SNAPSHOT_EVERY
+
+    assert len(history.rows) == settings.NOTE_REVISION_RETENTION
+    assert {row.kind for row in history.rows} == {SNAPSHOT, DIFF}
+
+
+def test_restore_after_snapshots_are_pruned(history_settings, monkeypatch):
+    history = History("v1")
+    for number in range(2, 30):
+        history.save(f"v{number}")
+
+    # Лимит меньше интервала снимков: все снимки удаляются, версии восстанавливаются от текущего текста
+    monkeypatch.setattr(settings, "NOTE_REVISION_RETENTION", 3)
+    for number in range(30, 40):
+        history.save(f"v{number}")
+
+        assert all(row.kind == DIFF for row in history.rows)
+        for row in history.rows:
+            assert history.get(row.version) == history.texts[row.version]
+
+
+def test_snapshot_stores_replaced_text(history_settings):
+    assert revision_data(SNAPSHOT, "old", "new") == "old"
+    assert reconstruct("new", [SimpleNamespace(kind=DIFF, data=revision_data(DIFF, "old", "new"))]) == "old"
@@ -0,0 +1,67 @@
+"""
+Компактные патчи текста заметки (apply_patch / make_patch)
+"""
+import random
+
+import pytest
+
+from app.defs.dashboard.text_patch import apply_patch, make_patch
+from tests.helpers import random_edit, random_text
+
+
+def test_example_from_docstring():
+    assert apply_patch("Привет world", [7, -5, "мир"]) == "Привет мир"
+
+
+@pytest.mark.parametrize("old, new", [
+    ("", ""),
+    ("", "text"),
+    ("text", ""),
+    ("same", "same"),
+    ("aaa", "aaaa"),
+    ("abc", "aXc"),
+    ("emoji 😀 here", "emoji 😀😀 here"),
+    ("𝄞 clef", "𝄞𝄞 clef"),
+    ("😀", "😁")
+])
+def test_round_trip(old, new):
+    assert apply_patch(old, make_patch(old, new)) == new
+
+
+def test_random_round_trip():
+    rng = random.Random(0)
+    for _ in range(2000):
+        old = random_text(rng, rng.randint(0, 30))
+        new = random_edit(rng, old) if rng.random() < 0.8 else random_text(rng, rng.randint(0, 30))
+
+        assert apply_patch(old, make_patch(old, new)) == new
+        assert apply_patch(new, make_patch(new, old)) == old
+
+
+def test_local_edit_is_compact():
+    old = "x" * 10000 + "middle" + "y" * 10000
+
+    assert make_patch(old, old.replace("middle", "center")) == [10000, -6, "center"]
+
+
+def test_positions_are_code_points():
+    # "😀" - один символ, хотя в UTF-16 это два
+    assert apply_patch("😀a", [1, -1, "b"]) == "😀b"
+
+
+def test_untouched_tail_is_kept():
+    assert apply_patch("hello world", ["Oh, ", 5]) == "Oh, hello world"
+
+
+@pytest.mark.parametrize("ops", [
+    "not a list",
+    [100],
+    [-100],
+    [0],
+    [True],
+    [1.5],
+    [None]
+])
+def test_invalid_patch(ops):
+    with pytest.raises(ValueError):
+        apply_patch("short", ops)
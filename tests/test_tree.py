@@ -0,0 +1,119 @@
+"""
+Сборка дерева папок и заметок (build_tree) и склейка JSON дерева из Postgres (splice_tree_json)
+"""
+import asyncio
+import json
+import sys
+import uuid
+
+from app.defs.dashboard.tree import build_tree
+from tests.helpers import folder, legacy_build_tree, make_rows, note, splice, tree_rows
+
+
+def test_matches_legacy_builder():
+    folders, notes = make_rows(300, 1200, seed=1)
+
+    assert build_tree(folders, notes) == legacy_build_tree(folders, notes)
+
+
+def test_empty():
+    assert build_tree([], []) == []
+
+
+def test_skeleton_has_no_content_and_counts_children():
+    root = folder(uuid.uuid4())
+    child = folder(uuid.uuid4(), root.id)
+    notes = [note(root.id), note(root.id), note(child.id), note()]
+
+    tree = build_tree([root, child], notes, skeleton=True)
+
+    assert [item["type"] for item in tree] == ["folder", "note"]
+    assert tree[0]["children_count"] == 3
+    assert tree[0]["children"][0]["children_count"] == 1
+    assert all("content" not in item for item in tree[0]["children"][1:])
+    assert "content" not in tree[1]
+
+
+def test_nesting_deeper_than_recursion_limit():
+    depth = sys.getrecursionlimit() + 100
+    ids = [uuid.uuid4() for _ in range(depth)]
+    folders = [folder(folder_id, ids[index - 1] if index else None) for index, folder_id in enumerate(ids)]
+    leaf_note = note(ids[-1])
+
+    tree = build_tree(reversed(folders), [leaf_note])
+
+    item = tree[0]
+    for folder_id in ids[:-1]:
+        assert item["id"] == str(folder_id)
+        assert len(item["children"]) == 1
+        item = item["children"][0]
+    assert item["id"] == str(ids[-1])
+    assert item["children"][0]["id"] == str(leaf_note.id)
+
+
+def test_cycles_are_skipped():
+    root = folder(uuid.uuid4(), title="root")
+    child = folder(uuid.uuid4(), root.id, title="child")
+
+    first, second = uuid.uuid4(), uuid.uuid4()
+    cycle = [folder(first, second), folder(second, first)]
+    self_parent = uuid.uuid4()
+    loop = folder(self_parent, self_parent)
+
+    tree = build_tree([root, child, *cycle, loop], [note(first), note(self_parent), note(child.id)])
+
+    assert len(tree) == 1
+    assert tree[0]["id"] == str(root.id)
+    assert tree[0]["children"][0]["id"] == str(child.id)
+    assert tree[0]["children"][0]["children"][0]["type"] == "note"
+
+
+def spliced(rows):
+    return json.loads(asyncio.run(splice(rows)))
+
+
+def test_splice_matches_build_tree():
+    folders, notes = make_rows(300, 1200, seed=2)
+
+    for skeleton in (False, True):
+        tree = build_tree(folders, notes, skeleton=skeleton)
+        assert spliced(tree_rows(tree)) == tree
+
+
+def test_splice_empty_tree():
+    assert spliced([(0, None, "[]", None)]) == []
+
+
+def test_splice_fills_compressed_content():
+    folders, notes = make_rows(50, 200, seed=3)
+    notes[0].folder_id = None
+    notes[0].content = "Большая заметка 😀 " * 100
+    tree = build_tree(folders, notes)
+
+    packed_ids = {str(note.id) for note in notes[::7]}
+    rows = tree_rows(tree, packed_ids)
+
+    assert any(packed for _, _, _, packed in rows[:-1])
+    assert rows[-1][3] is not None
+    assert spliced(rows) == tree
+
+
+def test_splice_closes_several_levels_at_once():
+    ids = [uuid.uuid4() for _ in range(4)]
+    folders = [
+        folder(ids[0]),
+        folder(ids[1], ids[0]),
+        folder(ids[2], ids[1]),
+        folder(ids[3])
+    ]
+    tree = build_tree(folders, [note(ids[0]), note(ids[2]), note()])
+
+    rows = tree_rows(tree)
+    assert [depth for depth, _, _, _ in rows] == [1, 2, 3, 1, 0]
+    assert spliced(rows) == tree
+
+
+def test_splice_only_root_notes():
+    tree = build_tree([], [note(), note()])
+
+    assert spliced(tree_rows(tree)) == tree
@@ -0,0 +1,113 @@
+"""
+Кэш сериализованного дерева
+"""
+import asyncio
+
+import pytest
+
+from app.defs.dashboard import defs
+from app.defs.dashboard.tree_cache import MemoryTreeCacheBackend, TreeCache, TreeCacheBackend
+
+
+def make_cache(**limits):
+    options = {"max_entries": 10, "max_bytes": 1024, "ttl_seconds": 60, **limits}
+    return TreeCache(MemoryTreeCacheBackend(**options))
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        TreeCacheBackend()
+
+
+def test_stale_revision_is_a_miss():
+    cache = make_cache()
+    cache.set(1, False, 5, b"[]")
+
+    assert cache.get(1, False, 5) == b"[]"
+    assert cache.get(1, False, 6) is None
+    assert cache.get(1, True, 5) is None
+
+
+def test_invalidate_drops_both_modes():
+    cache = make_cache()
+    cache.set(1, False, 1, b"[1]")
+    cache.set(1, True, 1, b"[2]")
+
+    cache.invalidate(1)
+
+    assert cache.get(1, False, 1) is None
+    assert cache.get(1, True, 1) is None
+    assert cache.stats()["size_bytes"] == 0
+
+
+def test_evicts_least_recently_used_by_size():
+    cache = make_cache(max_bytes=10)
+    cache.set(1, False, 1, b"12345")
+    cache.set(2, False, 1, b"12345")
+    cache.get(1, False, 1)
+    cache.set(3, False, 1, b"12345")
+
+    assert cache.get(2, False, 1) is None
+    assert cache.get(1, False, 1) == b"12345"
+    assert cache.stats() == {
+        "hits": 2,
+        "misses": 1,
+        "hit_rate": 2 / 3,
+        "entries": 2,
+        "size_bytes": 10,
+        "evictions": 1
+    }
+
+
+def test_payload_limit():
+    assert make_cache().payload_limit() == 1024
+    assert make_cache(max_entries=0).payload_limit() == 0
+
+
+class FakeSessionFactory:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def stream(monkeypatch, cache, chunks):
+    """Dashboard.stream_tree с подменённым потоком JSON из Postgres"""
+    async def stream_tree_json(session, user_id, skeleton=False):
+        for chunk in chunks:
+            yield chunk
+
+    monkeypatch.setattr(defs, "tree_cache", cache)
+    monkeypatch.setattr(defs, "AsyncSessionLocal", FakeSessionFactory)
+    monkeypatch.setattr(defs, "stream_tree_json", stream_tree_json)
+
+    async def collect():
+        user = defs.User(id=1)
+        return [chunk async for chunk in defs.Dashboard(None).stream_tree(user, revision=3)]
+
+    return asyncio.run(collect())
+
+
+def test_stream_tree_caches_small_tree(monkeypatch):
+    cache = make_cache()
+
+    assert stream(monkeypatch, cache, [b"[", b"1", b"]"]) == [b"[", b"1", b"]"]
+    assert cache.get(1, False, 3) == b"[1]"
+    assert stream(monkeypatch, cache, [b"never read"]) == [b"[1]"]
+
+
+def test_stream_tree_does_not_cache_tree_over_limit(monkeypatch):
+    cache = make_cache(max_bytes=10)
+    chunks = [b"[" + b"1," * 4, b"2" * 4, b"]"]
+
+    assert stream(monkeypatch, cache, chunks) == chunks
+    assert cache.get(1, False, 3) is None
+    assert cache.stats()["size_bytes"] == 0
+
+
+def test_stream_tree_with_disabled_cache(monkeypatch):
+    cache = make_cache(max_entries=0)
+
+    assert stream(monkeypatch, cache, [b"[]"]) == [b"[]"]
+    assert cache.get(1, False, 3) is None
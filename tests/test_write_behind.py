@@ -0,0 +1,117 @@
+"""
+Буфер отложенной записи: удаление во время записи, фоновая задача и блокировки пользователей.
+Запись в БД (WriteBehindBuffer._write) подменяется.
+"""
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from app.defs.dashboard.write_behind import PendingNoteWrite, WriteBehindBuffer
+
+
+def pending_write(buffer, user_id=1):
+    pending = PendingNoteWrite(SimpleNamespace(id=user_id), uuid.uuid4(), "Title", "text", 1, 1)
+    buffer.put(pending)
+    return pending
+
+
+def test_discard_waits_for_running_write():
+    buffer = WriteBehindBuffer(1)
+    pending = pending_write(buffer)
+    started, finish = asyncio.Event(), asyncio.Event()
+
+    async def slow_write(_):
+        started.set()
+        await finish.wait()
+        return True
+
+    buffer._write = slow_write
+
+    async def scenario():
+        flush = asyncio.create_task(buffer.flush_note(pending.note_id))
+        await started.wait()
+        discard = asyncio.create_task(buffer.discard(1, pending.note_id))
+        await asyncio.sleep(0)
+        assert not discard.done()
+
+        finish.set()
+        await asyncio.gather(flush, discard)
+
+    asyncio.run(scenario())
+
+    assert buffer.stats()["pending"] == 0
+    assert buffer._locks == {}
+
+
+def test_flush_after_discard_is_noop():
+    buffer = WriteBehindBuffer(1)
+    pending = pending_write(buffer)
+    writes = []
+
+    async def write(item):
+        writes.append(item)
+        return True
+
+    buffer._write = write
+
+    async def scenario():
+        await buffer.discard(1, pending.note_id)
+        await buffer.flush_note(pending.note_id)
+
+    asyncio.run(scenario())
+
+    assert writes == []
+
+
+def test_failed_write_keeps_edits():
+    buffer = WriteBehindBuffer(1)
+    pending = pending_write(buffer)
+
+    async def failing_write(_):
+        return False
+
+    buffer._write = failing_write
+    asyncio.run(buffer.flush_user(1))
+
+    assert buffer.get(pending.note_id) is pending
+    assert buffer._locks == {}
+
+
+def test_background_task_survives_errors():
+    buffer = WriteBehindBuffer(0.02)
+    calls = []
+
+    async def flush_due():
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    buffer.flush_due = flush_due
+
+    async def scenario():
+        buffer.start()
+        await asyncio.sleep(0.1)
+        await buffer.stop()
+
+    asyncio.run(scenario())
+
+    assert len(calls) > 1
+
+
+def test_user_locks_are_serialized_and_pruned():
+    buffer = WriteBehindBuffer(1)
+    order = []
+
+    async def worker(name):
+        async with buffer.lock(1):
+            order.append(f"{name} in")
+            await asyncio.sleep(0)
+            order.append(f"{name} out")
+
+    async def scenario():
+        await asyncio.gather(*(worker(name) for name in "abc"))
+
+    asyncio.run(scenario())
+
+    assert order == ["a in", "a out", "b in", "b out", "c in", "c out"]
+    assert buffer._locks == {}